@@ -21,6 +21,7 @@ def branch(iteration, branchLength, angle):
   turtle.left(angle)
   turtle.back(branchLength)
 
-branch(7, 50, 30)
+with turtle.recording():
+  branch(7, 50, 30)
 
 onefinity.print_gcode()
@@ -0,0 +1,124 @@
+import math
+
+from .postprocess import Stage
+
+################################################################################
+# Arc Fitting -- Collapse runs of short G1 chords back into G2/G3 arcs
+#
+# Turtle circles, frame corners, and L-system curves all come out as streams of
+# tiny G1 segments.  ArcFitter watches the command stream for runs of G1 moves
+# in the XY-plane (same Z, same feed, no E/I/J/P/S) and replaces any stretch
+# whose points all lie within `tolerance` of one circular arc with a single
+# G2/G3.  Every original point stays within `tolerance` of the arc, and so does
+# every original chord.  Comments on the replaced moves go with them.
+################################################################################
+
+class ArcFitter(Stage):
+
+    def __init__(self, tolerance, min_segments=3, max_segments=256):
+        super().__init__(tolerance)
+        self.min_segments = min_segments
+        self.max_segments = max_segments
+        self.window = max(self.window, 2*max_segments) # Room to look ahead
+        self.arcs = 0     # G2/G3 emitted
+        self.segments = 0 # G1 moves they replaced
+
+    def extends(self, run, command):
+        if command.get('code') != 'G1' or not self.absolute or self.position is None:
+            return False
+        if any(command.get(word) is not None for word in command if word not in ('code', 'x', 'y', 'z', 'f', 'comment', 'style')):
+            return False
+        z = command.get('z')
+        if z is not None and z != self.position[2]:
+            return False
+        return not run or command.get('f') == run[0].get('f')
+
+    def report(self):
+        return f"Arc fitting replaced {self.segments} moves with {self.arcs} arcs"
+
+################################################################################
+# ArcFitter.fit(run, final=True) -- Greedily replace the longest arcs we can find
+#
+# Each decision only looks max_segments moves ahead, so with final=False it
+# stops while that much of the run is left and keeps the rest open.  Output is
+# the same as fitting the whole run in one go.
+################################################################################
+
+    def settle(self):
+        run, self.run = self.run, []
+        yield from self.fit(run, final=False)
+
+    def fit(self, run, final=True):
+        if not run:
+            return
+        points = [self.position[:2]]
+        for command in run:
+            x, y = points[-1]
+            points.append((x if command.get('x') is None else command['x'], y if command.get('y') is None else command['y']))
+        n = 0
+        while n < len(run):
+            if not final and n + self.max_segments >= len(run):
+                self.run = run[n:]
+                return
+            best = None
+            for k in range(n+self.min_segments, min(len(run), n+self.max_segments)+1):
+                arc = self.circle(points[n:k+1])
+                if arc is None:
+                    break
+                best = k, arc
+            if best is None:
+                self.track(run[n])
+                yield run[n]
+                n += 1
+                continue
+            k, (code, c_x, c_y) = best
+            if self.plane != 'G17':
+                self.plane = 'G17'
+                yield {'code': 'G17', 'comment': 'Arcs in XY-plane'}
+            x, y = points[n]
+            arc = {'code': code, 'x': points[k][0], 'y': points[k][1], 'i': c_x-x, 'j': c_y-y, 'f': run[n].get('f'), 'comment': f"Arc fitted to {k-n} moves"}
+            self.track(arc)
+            self.arcs += 1
+            self.segments += k-n
+            yield arc
+            n = k
+
+################################################################################
+# ArcFitter.circle(points) -- ('G2' or 'G3', c_x, c_y) if every point and chord
+# is within tolerance of the arc through the first, middle, and last points
+################################################################################
+
+    def circle(self, points):
+        (x1, y1), (x2, y2), (x3, y3) = points[0], points[len(points)//2], points[-1]
+        d = 2*(x1*(y2-y3) + x2*(y3-y1) + x3*(y1-y2))
+        if abs(d) < 1e-12:
+            return None
+        a, b, c = x1*x1+y1*y1, x2*x2+y2*y2, x3*x3+y3*y3
+        c_x = (a*(y2-y3) + b*(y3-y1) + c*(y1-y2))/d
+        c_y = (a*(x3-x2) + b*(x1-x3) + c*(x2-x1))/d
+        r = math.hypot(x1-c_x, y1-c_y)
+
+        # Nearly straight runs are better left to simplification
+        chord = math.hypot(x3-x1, y3-y1)
+        if abs((x3-x1)*(y2-y1) - (y3-y1)*(x2-x1)) <= self.tolerance*chord:
+            return None
+
+        sweep = 0
+        direction = 0
+        angle = math.atan2(y1-c_y, x1-c_x)
+        for (x, y), (u, v) in zip(points, points[1:]):
+            if abs(math.hypot(u-c_x, v-c_y) - r) > self.tolerance:
+                return None
+            half = math.hypot(u-x, v-y)/2
+            if half > r or r - math.sqrt(r*r - half*half) > self.tolerance:
+                return None
+            step = math.atan2(v-c_y, u-c_x) - angle
+            step = (step + math.pi) % (2*math.pi) - math.pi
+            angle += step
+            if step == 0 or (direction and (step > 0) != (direction > 0)):
+                return None
+            direction = step
+            sweep += abs(step)
+        if sweep >= 1.9*math.pi:
+            return None
+        return ('G3' if direction > 0 else 'G2'), c_x, c_y
@@ -0,0 +1,165 @@
+import array
+import json
+import struct
+import sys
+
+from .command_queue import CommandQueue
+from .compression import compressor, decompressor
+from .formatter import Formatter
+from .modal import ModalState
+
+RED  = '\033[31m' # Red
+ENDC = '\033[0m'  # End Color
+
+MAGIC = b'PYGDK-CQ\x01'
+
+################################################################################
+# Binary Command Stream
+#
+# A compact, lossless dump of the command stream: the CommandQueue columns as
+# they sit in memory, written block by block.
+#
+#   MAGIC
+#   u32 length, JSON header -- {"Name", "Precision", "Modal Motion"}
+#   blocks, each:
+#     u32 rows, u32 values, u32 length, JSON list of new interned strings
+#     rows x u16 mask, rows x i32 code, rows x i32 note, values x f64
+#   u32 0 -- end of stream
+#
+# Interned strings are numbered across the whole file, so each one is only
+# written the first time it shows up.  Everything is little-endian.
+################################################################################
+
+class Encoder:
+
+    def __init__(self, file, header):
+        self.file = file
+        self.table = {}
+        self.file.write(MAGIC)
+        self.write_json(header)
+
+    def write_json(self, value):
+        data = json.dumps(value).encode()
+        self.file.write(struct.pack('<I', len(data)) + data)
+
+    def intern(self, value, new):
+        index = self.table.get(value)
+        if index is None:
+            index = self.table[value] = len(self.table)
+            new.append(value)
+        return index
+
+################################################################################
+# Encoder.write(queue, start, stop) -- One block of rows from any CommandQueue
+################################################################################
+
+    def write(self, queue, start, stop):
+        if stop <= start:
+            return
+        mask, offset, values, codes, notes = queue.block(start, stop)
+        table = queue.table
+        new = []
+        cache = {-1: -1}
+        for column in (codes, notes):
+            for n, index in enumerate(column):
+                if index not in cache:
+                    cache[index] = self.intern(table[index], new)
+                column[n] = cache[index]
+        self.file.write(struct.pack('<II', len(mask), len(values)))
+        self.write_json(new)
+        for column in (mask, codes, notes, values):
+            if sys.byteorder != 'little':
+                column.byteswap()
+            self.file.write(column.tobytes())
+
+    def close(self):
+        self.file.write(struct.pack('<I', 0))
+
+################################################################################
+# decode(file) -- (header, generator of CommandQueue blocks)
+#
+# `file` is a path or a binary stream, gzip/zstd compressed or not.  A file
+# opened from a path is closed once the blocks run out or the generator is
+# closed.
+################################################################################
+
+def decode(file):
+    opened = None
+    if not hasattr(file, 'read'):
+        file = opened = open(file, 'rb')
+    try:
+        file = decompressor(file)
+        if read(file, len(MAGIC)) != MAGIC:
+            raise ValueError(f"{RED}Not a pygdk binary command stream{ENDC}")
+        header = read_json(file)
+    except BaseException:
+        if opened is not None:
+            opened.close()
+        raise
+    return header, blocks(file, opened)
+
+def blocks(file, opened=None):
+    try:
+        yield from queues(file)
+    finally:
+        if opened is not None:
+            opened.close()
+
+def queues(file):
+    table = []
+    interned = {} # Kept across blocks, so each string is only interned once
+    while True:
+        rows, = struct.unpack('<I', read(file, 4))
+        if not rows:
+            return
+        values, = struct.unpack('<I', read(file, 4))
+        for value in read_json(file):
+            value = value if isinstance(value, str) else tuple(value)
+            interned[value] = len(table)
+            table.append(value)
+        columns = []
+        for typecode, count in (('H', rows), ('i', rows), ('i', rows), ('d', values)):
+            column = array.array(typecode)
+            column.frombytes(read(file, column.itemsize*count))
+            if sys.byteorder != 'little':
+                column.byteswap()
+            columns.append(column)
+        mask, codes, notes, values = columns
+        yield CommandQueue.from_columns(mask, values, codes, notes, table, interned)
+
+def read(file, n):
+    data = file.read(n)
+    while len(data) < n:
+        more = file.read(n - len(data))
+        if not more:
+            raise ValueError(f"{RED}Binary command stream ended early{ENDC}")
+        data += more
+    return data
+
+def read_json(file):
+    length, = struct.unpack('<I', read(file, 4))
+    return json.loads(read(file, length))
+
+################################################################################
+# expand(file) -- Generator of G-code lines for a binary command stream
+#
+# Gives the same lines as Machine.save_gcode(profile='production') would have
+# for the same commands: no comments, modal words elided.
+################################################################################
+
+def expand(file, elide=True):
+    header, queues = decode(file)
+    formatter = Formatter(header.get('Precision'))
+    modal = ModalState(formatter.precision, header.get('Modal Motion', False)) if elide else None
+    for queue in queues:
+        yield from filter(None, formatter.lines(queue, 0, len(queue), lambda comment, style: "", modal))
+
+################################################################################
+# python -m pygdk.binary job.gcb > job.nc
+################################################################################
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        sys.exit("usage: python -m pygdk.binary <file>")
+    for line in expand(sys.argv[1]):
+        print(line)
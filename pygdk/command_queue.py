@@ -0,0 +1,234 @@
+import array
+
+try:
+    import numpy
+except ImportError: # Block appends fall back to plain Python
+    numpy = None
+
+RED  = '\033[31m' # Red
+ENDC = '\033[0m'  # End Color
+
+################################################################################
+# Column Layout
+#
+# Every queued command is one row.  Which numeric words a row carries is kept in
+# a bitmask, so "not given" and 0 stay distinct, and only the words that are
+# actually present are packed into one typed value pool.  The code string and
+# the (comment, style) pair are interned into a side table, so the thousands of
+# identical 'G1' and 'turtle' strings are only stored once.
+################################################################################
+
+WORDS = ('x', 'y', 'z', 'e', 'i', 'j', 'p', 'f', 's')
+FIELDS = ('code',) + WORDS + ('comment', 'style')
+BITS = {word: 1 << n for n, word in enumerate(WORDS)}
+
+class CommandQueue:
+
+################################################################################
+# CommandQueue.__init__() -- Empty columns, optionally seeded with commands
+################################################################################
+
+    def __init__(self, commands=None):
+        self._mask = array.array('H')   # Which WORDS are present in each row
+        self._offset = array.array('I') # Where each row starts in _values
+        self._values = array.array('d') # Present WORDS, packed in WORDS order
+        self._code = array.array('i')   # Interned code, -1 if absent
+        self._note = array.array('i')   # Interned (comment, style), -1 if absent
+        self._table = []
+        self._interned = {}
+        if commands:
+            self.extend(commands)
+
+################################################################################
+# String Interning
+################################################################################
+
+    def intern(self, value):
+        index = self._interned.get(value)
+        if index is None:
+            index = len(self._table)
+            self._interned[value] = index
+            self._table.append(value)
+        return index
+
+################################################################################
+# CommandQueue.append(command) -- Store a dict of G-code words as one row
+################################################################################
+
+    def append(self, command):
+        for key in command:
+            if key not in FIELDS:
+                raise TypeError(f"{RED}'{key}' is not a G-code word the command queue knows how to store.  Options are: {FIELDS}{ENDC}")
+        # Everything that can fail happens before any column grows, so a bad
+        # command leaves the columns lined up
+        mask = 0
+        values = []
+        for word in WORDS:
+            value = command.get(word)
+            if value is not None:
+                mask |= BITS[word]
+                values.append(float(value))
+        code = command.get('code')
+        code = -1 if code is None else self.intern(code)
+        comment = command.get('comment')
+        style = command.get('style')
+        note = -1 if comment is None and style is None else self.intern((comment, style))
+        self._offset.append(len(self._values))
+        self._values.extend(values)
+        self._mask.append(mask)
+        self._code.append(code)
+        self._note.append(note)
+
+    def extend(self, commands):
+        for command in commands:
+            self.append(command)
+
+################################################################################
+# CommandQueue.extend_block(code, columns, notes=None) -- Many rows at once
+#
+# Every row gets the same code and the same words, one value per row from each
+# column in `columns` ({word: sequence}).  `notes` is an optional list of
+# (comment, style) pairs or None, one per row.
+################################################################################
+
+    def extend_block(self, code, columns, notes=None):
+        for word in columns:
+            if word not in WORDS:
+                raise TypeError(f"{RED}'{word}' is not a G-code word the command queue knows how to store.  Options are: {WORDS}{ENDC}")
+        words = [word for word in WORDS if word in columns]
+        rows = len(columns[words[0]]) if words else len(notes or [])
+        mask = 0
+        for word in words:
+            mask |= BITS[word]
+        for word in words:
+            if len(columns[word]) != rows:
+                raise ValueError(f"{RED}Every column in a block needs one value per row: '{word}' has {len(columns[word])}, not {rows}{ENDC}")
+        if notes is not None and len(notes) != rows:
+            raise ValueError(f"{RED}A block needs one note per row: got {len(notes)}, not {rows}{ENDC}")
+        if numpy is not None and words:
+            values = numpy.column_stack([numpy.asarray(columns[word], dtype=float) for word in words]).tobytes()
+        else:
+            values = array.array('d', [float(value) for row in zip(*(columns[word] for word in words)) for value in row]).tobytes()
+        code = -1 if code is None else self.intern(code)
+        notes = [-1]*rows if notes is None else [-1 if note is None else self.intern(note) for note in notes]
+        start = len(self._values)
+        self._offset.extend(range(start, start + rows*len(words), len(words)) if words else [start]*rows)
+        self._values.frombytes(values)
+        self._mask.extend([mask]*rows)
+        self._code.extend([code]*rows)
+        self._note.extend(notes)
+
+################################################################################
+# Row Access -- Rows come back out as the same dicts that went in
+################################################################################
+
+    def row(self, n):
+        command = {}
+        if self._code[n] >= 0:
+            command['code'] = self._table[self._code[n]]
+        mask = self._mask[n]
+        offset = self._offset[n]
+        for word in WORDS:
+            if mask & BITS[word]:
+                value = self._values[offset]
+                command[word] = int(value) if word == 'p' else value
+                offset += 1
+        if self._note[n] >= 0:
+            comment, style = self._table[self._note[n]]
+            if comment is not None:
+                command['comment'] = comment
+            if style is not None:
+                command['style'] = style
+        return command
+
+    @property
+    def table(self):
+        return self._table
+
+################################################################################
+# CommandQueue.block(start, stop) -- Copies of the raw columns for a run of rows
+#
+# Returns (mask, offset, values, code, note).  Offsets still count from the
+# start of the whole pool, while values begins at the first row of the block,
+# so subtract offset[0] before indexing.
+################################################################################
+
+    def block(self, start, stop):
+        offset = self._offset[start:stop]
+        base = offset[0] if offset else 0
+        end = self._offset[stop] if stop < len(self) else len(self._values)
+        return self._mask[start:stop], offset, self._values[base:end], self._code[start:stop], self._note[start:stop]
+
+################################################################################
+# CommandQueue.from_columns(mask, values, code, note, table, interned=None) --
+# The reverse of block(), for columns that were saved somewhere else.  Offsets
+# are rebuilt from the masks.
+#
+# `interned` is the {value: index} dict for `table`.  If it's given, the queue
+# shares both instead of interning the whole table over again, so many blocks
+# can be built against one growing table.
+################################################################################
+
+    @classmethod
+    def from_columns(cls, mask, values, code, note, table, interned=None):
+        queue = cls()
+        queue._mask = array.array('H', mask)
+        queue._values = array.array('d', values)
+        queue._code = array.array('i', code)
+        queue._note = array.array('i', note)
+        offset = 0
+        for bits in queue._mask:
+            queue._offset.append(offset)
+            offset += bin(bits).count('1')
+        if offset != len(queue._values):
+            raise ValueError(f"{RED}Command masks call for {offset} values, but there are {len(queue._values)}{ENDC}")
+        if interned is None:
+            for value in table:
+                queue.intern(value)
+        else:
+            queue._table = table
+            queue._interned = interned
+        return queue
+
+    def __getitem__(self, n):
+        if isinstance(n, slice):
+            return [self.row(i) for i in range(*n.indices(len(self)))]
+        if n < 0:
+            n += len(self)
+        if not 0 <= n < len(self):
+            raise IndexError('CommandQueue index out of range')
+        return self.row(n)
+
+    def __iter__(self):
+        for n in range(len(self)):
+            yield self.row(n)
+
+    def __len__(self):
+        return len(self._mask)
+
+################################################################################
+# CommandQueue.discard(n) -- Drop the oldest n rows
+#
+# Used when rows have already been written out.  The intern table is rebuilt
+# from what is left so that one-off comments don't pile up forever.
+################################################################################
+
+    def discard(self, n):
+        n = min(n, len(self))
+        start = self._offset[n] if n < len(self) else len(self._values)
+        del self._values[:start]
+        del self._mask[:n]
+        self._offset = array.array('I', (offset - start for offset in self._offset[n:]))
+        table = self._table
+        self._table = []
+        self._interned = {}
+        self._code = array.array('i', (-1 if i < 0 else self.intern(table[i]) for i in self._code[n:]))
+        self._note = array.array('i', (-1 if i < 0 else self.intern(table[i]) for i in self._note[n:]))
+
+################################################################################
+# Memory Footprint -- Bytes held by the typed columns
+################################################################################
+
+    def nbytes(self):
+        columns = [self._mask, self._offset, self._values, self._code, self._note]
+        return sum(column.itemsize * len(column) for column in columns)
@@ -0,0 +1,86 @@
+import gzip
+import io
+
+try:
+    import zstandard
+except ImportError: # zstd is optional
+    zstandard = None
+
+RED  = '\033[31m' # Red
+ENDC = '\033[0m'  # End Color
+
+COMPRESSIONS = {
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+MAGIC = {
+    b'\x1f\x8b': 'gzip',
+    b'\x28\xb5\x2f\xfd': 'zstd',
+}
+
+################################################################################
+# compression_for(filename) -- 'gzip', 'zstd', or None from the file extension
+################################################################################
+
+def compression_for(filename):
+    for compression, suffix in COMPRESSIONS.items():
+        if str(filename).endswith(suffix):
+            return compression
+    return None
+
+def check(compression):
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f"{RED}Unknown compression '{compression}'.  Options are: {list(COMPRESSIONS)}{ENDC}")
+    if compression == 'zstd' and zstandard is None:
+        raise ImportError(f"{RED}zstd compression needs the `zstandard` package.  Try `pip install zstandard`{ENDC}")
+    return compression
+
+################################################################################
+# compressor(file, compression) -- Binary stream that compresses into `file`
+#
+# Closing the compressor finishes the compressed stream but leaves `file` open.
+# With no compression, writes go straight through.
+################################################################################
+
+def compressor(file, compression):
+    check(compression)
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=file, mode='wb', mtime=0)
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor().stream_writer(file, closefd=False)
+    return Passthrough(file)
+
+################################################################################
+# decompressor(file) -- Binary stream of `file`, decompressed if its first bytes
+# say it's gzip or zstd
+################################################################################
+
+def decompressor(file):
+    if not hasattr(file, 'peek'):
+        file = io.BufferedReader(file)
+    head = file.peek(4)[:4]
+    for magic, compression in MAGIC.items():
+        if head.startswith(magic):
+            check(compression)
+            if compression == 'gzip':
+                return gzip.GzipFile(fileobj=file, mode='rb')
+            return zstandard.ZstdDecompressor().stream_reader(file, closefd=False)
+    return file
+
+class Passthrough:
+
+    def __init__(self, file):
+        self.file = file
+
+    def write(self, data):
+        return self.file.write(data)
+
+    def close(self):
+        self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
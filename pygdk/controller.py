@@ -10,6 +10,7 @@ class Controller:
         self.api_key = config.get('API Key', None)
         self.boot_wait = config.get('Boot Wait', 0)
         self.shutdown_wait = config.get('Shutdown Wait', 0)
+        self.compression = config.get('Compression', None)
         self.tasmota = Tasmota(config.get('Tasmota', None)) if config.get('Tasmota', None) else None
         self.wemo = WeMo(config.get('WeMo', None)) if config.get('WeMo', None) else None
 
@@ -15,8 +15,8 @@ ENDC   = '\033[0m'
 ################################################################################
 
 class FDMPrinter(Machine):
-    def __init__(self, json_file):
-        super().__init__(json_file)
+    def __init__(self, json_file, sink=None):
+        super().__init__(json_file, sink)
         self.queue(comment='Loading FDMPrinter parameters from JSON', style='fdm_printer')
         with open(f"machines/{json_file}") as f:
             if 'Filament Table' not in self.dict:
@@ -0,0 +1,214 @@
+try:
+    import numpy
+except ImportError: # Vectorized formatting is optional
+    numpy = None
+
+from .command_queue import WORDS, BITS
+
+RED  = '\033[31m' # Red
+ENDC = '\033[0m'  # End Color
+
+LETTERS = {
+    'x': 'X',   # X-coordinate
+    'y': 'Y',   # Y-coordinate
+    'z': 'Z',   # Z-coordinate
+    'e': 'E',   # Extruder Position
+    'i': 'I',   # Arc Center X-offset
+    'j': 'J',   # Arc Center Y-offset
+    'p': 'P',   # Number of helix turns
+    'f': 'F',   # Feed Rate
+    's': 'S',   # Spindle RPM, Bed/Hotend Temperature
+}
+
+class Formatter:
+
+################################################################################
+# Formatter.__init__() -- Decimal places per word, from the machine JSON
+#
+# `precision` is the optional "Precision" dict from the machine JSON, e.g.
+# {"X": 3, "Y": 3, "E": 5}.  Anything not listed keeps 4 decimal places.
+################################################################################
+
+    def __init__(self, precision=None):
+        self.precision = {word: 4 for word in WORDS if word != 'p'}
+        for letter, digits in (precision or {}).items():
+            word = letter.lower()
+            if word not in self.precision:
+                raise ValueError(f"{RED}Precision can only be set for {[LETTERS[word] for word in self.precision]}, not '{letter}'{ENDC}")
+            self.precision[word] = int(digits)
+        self.vectorize = numpy is not None
+        self.min_block = 64
+
+################################################################################
+# Scalar Path -- One dict at a time
+#
+# `note` turns a (comment, style) pair into whatever should trail the G-code
+# words on that line, e.g. "; Rapid to Safe Z".
+################################################################################
+
+    def word(self, word, value):
+        if word == 'p':
+            return f" P{value}"
+        return f" {LETTERS[word]}{value:.{self.precision[word]}f}"
+
+    def line(self, command, note):
+        code = command.get('code', None)
+        line = "" if code is None else f"{code}"
+        for word in WORDS:
+            if command.get(word, None) is not None:
+                line += self.word(word, command[word])
+        if code is None:
+            line = line.lstrip(' ')
+        comment = command.get('comment', None)
+        style = command.get('style', None)
+        if comment is not None or style is not None:
+            line += note(comment, style)
+        return line
+
+################################################################################
+# Formatter.lines(queue, start, stop, note, modal) -- Format a run of
+# CommandQueue rows
+#
+# Big blocks go through NumPy when it is available, small ones (and everything
+# when it isn't) go through the scalar path.  Both produce identical text.  If
+# a ModalState is given, redundant words are elided before formatting: `emit`
+# says which words get written, while `mask` still says which are stored.
+################################################################################
+
+    def lines(self, queue, start, stop, note, modal=None):
+        block = queue.block(start, stop)
+        mask, offset, values, codes, notes = block
+        emit = modal.elide(mask, offset, values, codes, queue.table) if modal else mask
+        if self.vectorize and stop - start >= self.min_block:
+            return self._vector_lines(block, emit, queue.table, note)
+        return self._scalar_lines(block, emit, queue.table, note)
+
+    def _scalar_lines(self, block, emit, table, note):
+        mask, offset, values, codes, notes = block
+        base = offset[0] if offset else 0
+        words = [(BITS[word], f" {LETTERS[word]}%d" if word == 'p' else f" {LETTERS[word]}%.{self.precision[word]}f") for word in WORDS]
+        lines = []
+        for n in range(len(mask)):
+            line = "" if codes[n] < 0 else f"{table[codes[n]]}"
+            position = offset[n] - base
+            for bit, template in words:
+                if mask[n] & bit:
+                    if emit[n] & bit:
+                        line += template % values[position]
+                    position += 1
+            if codes[n] < 0:
+                line = line.lstrip(' ')
+            if notes[n] >= 0:
+                line += note(*table[notes[n]])
+            lines.append(line)
+        return lines
+
+    def _vector_lines(self, block, emit, table, note):
+        mask, offset, values, codes, notes = block
+        mask = numpy.frombuffer(mask, dtype=numpy.uint16)
+        emit = numpy.frombuffer(emit, dtype=numpy.uint16)
+        position = numpy.frombuffer(offset, dtype=numpy.uint32).astype(numpy.int64)
+        position -= position[0]
+        values = numpy.frombuffer(values, dtype=numpy.float64)
+        lines = interned(codes, lambda code: f"{code}", table)
+        bare = (numpy.frombuffer(codes, dtype=numpy.int32) < 0) & (emit != 0)
+        for bit, word in enumerate(WORDS):
+            present = (mask >> bit) & 1 == 1
+            written = (emit >> bit) & 1 == 1
+            if written.any():
+                # Feeds, depths, etc. repeat a lot, so only format each distinct value once
+                found, inverse = numpy.unique(values[position[written]].view(numpy.int64), return_inverse=True)
+                found = found.view(numpy.float64)
+                if word == 'p':
+                    strings = numpy.char.add(' P', found.astype(numpy.int64).astype(str))[inverse]
+                else:
+                    strings = fixed(found, self.precision[word], f" {LETTERS[word]}")[inverse]
+                column = numpy.zeros(len(mask), dtype=strings.dtype)
+                column[written] = strings
+                lines = numpy.char.add(lines, column)
+            position += present
+        if bare.any(): # Code elided, so the first word shouldn't lead with a space
+            lines[bare] = numpy.char.lstrip(lines[bare], ' ')
+        lines = numpy.char.add(lines, interned(notes, lambda pair: note(*pair), table))
+        return lines.tolist()
+
+################################################################################
+# interned(indices, render, table) -- Render each distinct interned string once
+# and spread the results back out over the rows that use it.  -1 renders as ''.
+################################################################################
+
+def interned(indices, render, table):
+    indices = numpy.frombuffer(indices, dtype=numpy.int32)
+    unique, inverse = numpy.unique(indices, return_inverse=True)
+    rendered = numpy.array(['' if i < 0 else render(table[i]) for i in unique.tolist()], dtype=str)
+    return rendered[inverse]
+
+################################################################################
+# fixed(values, digits, prefix) -- Vectorized f"{prefix}{value:.{digits}f}"
+#
+# Values are scaled to integers and their ASCII digits are written straight
+# into a byte matrix, one row per value, which is then left-justified and read
+# back as strings.  Anything that lands too close to a rounding tie for the
+# scaled double to be trusted, or isn't finite, falls back to Python's own
+# formatting so the output is byte-identical to the scalar path.
+################################################################################
+
+def fixed(values, digits, prefix=''):
+    scaled, safe = trusted(values, digits)
+    integer = numpy.where(safe, numpy.rint(scaled), 0).astype(numpy.int64)
+    whole = integer // 10**digits
+    places = numpy.ones(len(values), dtype=numpy.int64)
+    while (whole >= 10**places).any():
+        places += whole >= 10**places
+    point = 1 + digits if digits else 0
+    width = 1 + int(places.max(initial=1)) + point
+    text = numpy.zeros((len(values), width), dtype=numpy.uint8)
+    for k in range(digits):
+        integer, digit = numpy.divmod(integer, 10)
+        text[:, width-1-k] = 48 + digit
+    if digits:
+        text[:, width-1-digits] = ord('.')
+    for k in range(width - 1 - point):
+        whole, digit = numpy.divmod(whole, 10)
+        text[:, width-1-point-k] = numpy.where(k < places, 48 + digit, 0)
+    negative = numpy.signbit(values)
+    first = width - point - places
+    text[negative, first[negative]-1] = ord('-')
+    shift = (first - negative)[:, None] + numpy.arange(width)
+    text = numpy.where(shift < width, numpy.take_along_axis(text, numpy.minimum(shift, width-1), axis=1), 0)
+    if prefix:
+        lead = numpy.frombuffer(prefix.encode(), dtype=numpy.uint8)
+        text = numpy.hstack([numpy.broadcast_to(lead, (len(values), len(lead))), text])
+    text = text.view(f"S{text.shape[1]}").ravel().astype(str)
+    if not safe.all():
+        text = text.astype(object)
+        for n in numpy.flatnonzero(~safe):
+            text[n] = f"{prefix}{values[n]:.{digits}f}"
+        text = text.astype(str)
+    return text
+
+################################################################################
+# quantized(values, digits) -- Vectorized round(value, digits)
+#
+# Two values come out equal exactly when they would be written as the same
+# text, which is what ModalState compares.
+################################################################################
+
+def quantized(values, digits):
+    scaled, safe = trusted(values, digits)
+    result = numpy.copysign(numpy.where(safe, numpy.rint(scaled), 0) / 10.0**digits, values)
+    for n in numpy.flatnonzero(~safe):
+        result[n] = round(float(values[n]), digits)
+    return result
+
+################################################################################
+# trusted(values, digits) -- |values| scaled by 10**digits, and which of those
+# are far enough from a rounding tie (and small enough) to round in binary
+################################################################################
+
+def trusted(values, digits):
+    scaled = numpy.abs(values) * 10.0**digits
+    with numpy.errstate(invalid='ignore'):
+        tie = numpy.abs(scaled - numpy.floor(scaled) - 0.5)
+        safe = numpy.isfinite(scaled) & (scaled < 2.0**52) & (tie > 1e-9 + scaled*1e-15)
+    return scaled, safe
@@ -14,8 +14,8 @@ ENDC   = '\033[0m'
 ################################################################################
 
 class Lathe(Machine):
-    def __init__(self, json_file):
-        super().__init__(json_file)
+    def __init__(self, json_file, sink=None):
+        super().__init__(json_file, sink)
         self.queue(comment='Loading Lathe parameters from JSON', style='lathe')
         with open(f"machines/{json_file}") as f:
             dict = json.load(f)
@@ -3,6 +3,10 @@ import math
 import os
 import requests
 import argparse
+import copy
+import itertools
+import shutil
+import tempfile
 import sys
 script = sys.argv[0]
 
@@ -10,6 +14,14 @@ from .tool import Tool
 from .turtle import Turtle
 from .controller import Controller
 from .accessory import Accessory
+from .command_queue import CommandQueue
+from .formatter import Formatter
+from .modal import ModalState
+from .rendering import Rendering
+from .arcs import ArcFitter
+from .simplify import Simplifier
+from .compression import COMPRESSIONS, compression_for, compressor
+from .binary import Encoder
 
 BLACK  = '\033[30m'
 RED    = '\033[31m'
@@ -29,13 +41,37 @@ LT_CYAN     = '\033[96m'
 LT_WHITE    = '\033[97m'
 ENDC   = '\033[0m'
 
+STYLES = {
+    '': GREEN,
+    'warning': RED,
+    'machine': YELLOW,
+    'feature': CYAN,
+    'tool': BROWN,
+    'turtle': PURPLE,
+    'fdm_printer': ORANGE,
+    'plotter': ORANGE,
+    'lathe': ORANGE,
+    'mill': ORANGE
+}
+
+################################################################################
+# Output Profiles
+#
+# debug      -- Every comment, colored for the terminal
+# annotated  -- Plain-text comments, but only at feature boundaries
+# production -- No comments at all, just the G-code the controller needs
+################################################################################
+
+PROFILES = ('debug', 'annotated', 'production')
+ANNOTATED = ('feature', 'turtle')
+
 class Machine:
 
 ################################################################################
 # Initializer -- Load details from JSON
 ################################################################################
 
-    def __init__(self, json_file):
+    def __init__(self, json_file, sink=None):
         if not json_file:
             raise ValueError(f"{RED}All machines must be initialized with a JSON config.  See https://github.com/cilynx/pygdk#quickstart for a quick introduction.")
         with open(f"machines/{json_file}") as f:
@@ -44,8 +80,28 @@ class Machine:
                 if not self.dict.get(req, None):
                     raise ValueError(f"{RED}All machines must have '{req}' defined in their JSON config.  See https://github.com/cilynx/pygdk/tree/main/machines for example configurations.")
             self.name = self.dict['Name']
-            self.command_queue = [{'comment': f"Initializing Machine {self.name}", 'style': 'machine'}]
+            self.formatter = Formatter(self.dict.get('Precision', None))
+            self.command_queue = CommandQueue([{'comment': f"Initializing Machine {self.name}", 'style': 'machine'}])
+            self._sink = None
+            self._sink_path = None
+            self._sink_owned = False
+            self._sink_separator = ""
+            self._streamed = False
+            self.sink_window = 1024
+            self.profile = 'debug'
+            self.sink_profile = 'production'
+            self.elide = True
+            self._sink_modal = None
+            self._sink_stages = None
+            self.arc_tolerance = None
+            self.simplify_tolerance = None
+            self.stages = []
+            self.cache_gcode = True
+            self._renderings = {} # Profile -> Rendering, if cache_gcode
+            self._recording = None # Turtle with recorded moves not yet queued
+            self._arc_plane = False # G17 sent for Machine.arc()
             self.controller = Controller(self.dict.get('Controller', None)) if self.dict.get('Controller', None) else None
+            self.modal_motion = self.dict.get('Modal Motion', bool(self.controller) and self.controller.flavor == 'buildbotics')
             self.accessories = None
             if self.dict.get('Accessories', None):
                 self.accessories = [Accessory(name, self.dict['Accessories'][name]) for name in self.dict['Accessories']]
@@ -77,6 +133,8 @@ class Machine:
         ap.add_argument("arg", help="Optional argument passed back to the calling script", nargs='?', default=None)
         self._args = ap.parse_args()
         self._initialized = True
+        if sink is not None:
+            self.sink = sink
 
 ################################################################################
 # Destructor
@@ -85,9 +143,10 @@ class Machine:
     # def __del__(self):
     def go(self):
         if hasattr(self, '_initialized'):
-            for line in self.dict.get('End G-Code', []):
-                self.queue(code=line[0], comment=line[1])
-            self.print_gcode()
+            if self.sink:
+                self.close_sink()
+            else:
+                self.print_gcode()
             if self._args.simulate: self.simulate()
             if self._args.load: self.send_gcode()
             if self._args.execute: self.send_gcode(start=True)
@@ -97,7 +156,87 @@ class Machine:
 ################################################################################
 
     def queue(self, **kwargs):
+        self.replay()
         self.command_queue.append(kwargs)
+        if self._sink and len(self.command_queue) >= 2*self.sink_window:
+            self.flush_sink(keep=self.sink_window)
+
+################################################################################
+# Machine.replay() -- Queue anything a Turtle is still holding in a recording
+#
+# Called before anything else is queued or generated, so recorded moves always
+# land in the order they were made.
+################################################################################
+
+    def replay(self):
+        if self._recording is not None:
+            self._recording.replay()
+
+################################################################################
+# Output Sink -- Write G-code out as it is queued instead of at the end
+#
+# With a sink attached, the command queue only ever holds between sink_window
+# and 2*sink_window commands.  Everything older is formatted, written to the
+# sink, and dropped, so memory stays flat no matter how long the job runs.
+################################################################################
+
+    @property
+    def sink(self):
+        return self._sink
+
+    @sink.setter
+    def sink(self, value):
+        if self._sink:
+            raise ValueError(f"{RED}{self.name} is already streaming G-code to {self._sink_path or self._sink}{ENDC}")
+        if hasattr(value, 'write'):
+            name = getattr(value, 'name', None)
+            self._sink = value
+            self._sink_path = name if isinstance(name, str) and os.path.isfile(name) else None
+            self._sink_owned = False
+        else:
+            self._sink = open(value, 'w')
+            self._sink_path = os.fspath(value)
+            self._sink_owned = True
+        self._streamed = True
+        self.queue(comment=f"Streaming G-code to {self._sink_path or self._sink}", style='machine')
+
+    def flush_sink(self, keep=0):
+        if not self._sink:
+            raise ValueError(f"{RED}Machine.flush_sink() requires a sink.  Construct the machine with one or set Machine.sink first.{ENDC}")
+        n = len(self.command_queue) - keep
+        if n > 0:
+            if self._sink_modal is None:
+                self._sink_modal = self.modal_state(self.sink_profile)
+            if self._sink_stages is None:
+                self._sink_stages = self.stages = self.post_processors()
+            self._write_sink(self.render_queue(0, n, profile=self.sink_profile, modal=self._sink_modal, stages=self._sink_stages, final=False))
+            self.command_queue.discard(n)
+
+    def close_sink(self):
+        self.replay()
+        self.flush_sink()
+        stages = self._sink_stages or []
+        self._write_sink(self.render_queue(0, 0, profile=self.sink_profile, modal=self._sink_modal, stages=stages))
+        self._write_sink(self.stage_reports(stages, self.sink_profile))
+        self._write_sink(self.end_gcode(self.sink_profile))
+        if self._sink_owned:
+            self._sink.close()
+        else:
+            self._sink.flush()
+        self._sink = None
+
+    def streamed_path(self):
+        if self._sink:
+            raise ValueError(f"{RED}Call Machine.close_sink() to finish the streamed G-code before using it{ENDC}")
+        if not self._sink_path:
+            raise ValueError(f"{RED}G-code was streamed to a stream rather than a file, so there is nothing to reopen{ENDC}")
+        return self._sink_path
+
+    def _write_sink(self, lines):
+        lines = "\n".join(lines)
+        if lines:
+            self._sink.write(self._sink_separator + lines)
+            self._sink_separator = "\n"
 
 ################################################################################
 # CAMotics-compatible Tool Table
@@ -300,6 +439,7 @@ class Machine:
 ################################################################################
 
     def move(self, x=None, y=None, z=None, e=None, absolute=True, machine_coord=False, li=False, comment=None):
+        self.replay()
         if x is not None:
             x = x+self.x_offset
         if y is not None:
@@ -344,6 +484,63 @@ class Machine:
 
     rapid = move
 
+################################################################################
+# Machine.moves(x, y, z, li=False, comments=None) -- A block of absolute moves
+#
+# The same as calling move(x[n], y[n], z[n], li=li, comment=comments[n]) for
+# every n, but queued in one go.  Used by Turtle.recording().
+################################################################################
+
+    def moves(self, x, y, z, li=False, comments=None):
+        x = [i+self.x_offset for i in x]
+        y = [i+self.y_offset for i in y]
+        z = [i+self.z_offset for i in z]
+        if not x:
+            return
+        self.absolute = True
+        if self._optimize:
+            old_pos = [self._x, self._y, self._z]
+            for new_pos in zip(x, y, z):
+                new_pos = list(new_pos)
+                if old_pos != new_pos:
+                    self._linear_moves[self._optimize_tool].append([old_pos, new_pos])
+                old_pos = new_pos
+        else:
+            f = self.feed if li else self.max_feed
+            columns = {'x': x, 'y': y, 'z': z}
+            if f is not None:
+                columns['f'] = [f]*len(x)
+            notes = None if comments is None else [None if comment is None else (comment, None) for comment in comments]
+            self.command_queue.extend_block('G1' if li else 'G0', columns, notes)
+            if self._sink and len(self.command_queue) >= 2*self.sink_window:
+                self.flush_sink(keep=self.sink_window)
+        self._x, self._y, self._z = x[-1], y[-1], z[-1]
+
+################################################################################
+# Machine.arc(x, y, i, j, clockwise=False, z=None, e=None, li=True) -- G2/G3
+#
+# An arc in the XY-plane from where we are to (x, y), around the center offset
+# (i, j) from where we are.
+################################################################################
+
+    def arc(self, x, y, i, j, clockwise=False, z=None, e=None, li=True, comment=None):
+        self.replay()
+        if self._optimize:
+            raise ValueError(f"{RED}The _optimize option currently does not work with arcs{ENDC}")
+        x = x+self.x_offset
+        y = y+self.y_offset
+        if z is not None:
+            z = z+self.z_offset
+            self._z = z
+        self.absolute = True
+        if not self._arc_plane:
+            self.queue(code='G17', comment='Arcs in XY-plane')
+            self._arc_plane = True
+        f = self.feed if li else self.max_feed
+        self.queue(code='G2' if clockwise else 'G3', x=x, y=y, z=z, e=e, i=i, j=j, f=f, comment=comment)
+        self._x = x
+        self._y = y
+
     def irapid(self, u=None, v=None, w=None, comment=None):
         self.move(u, v, w, absolute=False, li=False, comment=comment)
 
@@ -478,7 +675,7 @@ class Machine:
 # Rectangular Frame
 ################################################################################
 
-    def frame(self, c_x, c_y, x, y, z_top=0, z_bottom=0, z_step=None, inside=False, retract=True, c='center', r=None, r_steps=10):
+    def frame(self, c_x, c_y, x, y, z_top=0, z_bottom=0, z_step=None, inside=False, retract=True, c='center', r=None, r_steps=None):
         self.queue(comment=f"Rectangular Frame | [c_x,c_y]: {['{:.4f}'.format(c_x), '{:.4f}'.format(c_y)]}, x: {x:.4f}, y: {y:.4f}, z_top: {z_top}, z_bottom: {z_bottom}, z_step: {z_step}, inside: {inside}, c: {c}, r: {r}", style='feature')
 
         if r is None:
@@ -519,6 +716,7 @@ class Machine:
         tool_r = tool_d/2
 
         turtle = self.turtle(verbose=True)
+        turtle.arcs = True # Unless r_steps asks for chords
         turtle.penup()
         turtle.goto(flx+r, fly-tool_r, z_top, comment="Rapid to front-left corner:")
         turtle.pendown(z_top)
@@ -526,7 +724,7 @@ class Machine:
             if i == passes:
                 z_step = 0
             turtle.forward(x-2*r, -z_step/4)
-            turtle.circle(radius=r+tool_r, extent=90, steps=r_steps) # TODO: Implement smooth Turtle circles and drop the steps here
+            turtle.circle(radius=r+tool_r, extent=90, steps=r_steps)
             turtle.forward(y-2*r, -z_step/4)
             turtle.circle(radius=r+tool_r, extent=90, steps=r_steps)
             turtle.forward(x-2*r, -z_step/4)
@@ -761,91 +959,254 @@ class Machine:
         self.queue(code=f"M0 (MSG, {msg})")
 
 ################################################################################
-# Generate G-code
-################################################################################
-
-    def generate_gcode(self):
-        if self.dict.get('End G-Code',None):
-            for line in self.dict.get('End G-Code'):
-                self.command_queue.append({'code':line[0], 'comment':line[1]})
-        self.gcode_array = []
-        self.gcode = ''
-        styles = {
-            '': GREEN,
-            'warning': RED,
-            'machine': YELLOW,
-            'feature': CYAN,
-            'tool': BROWN,
-            'turtle': PURPLE,
-            'fdm_printer': ORANGE,
-            'plotter': ORANGE,
-            'lathe': ORANGE,
-            'mill': ORANGE
-        }
-        for command in self.command_queue:
-            line = ""
-            if command.get('code',None) is not None:    # Code
-                line += f"{command.get('code','')}"
-            if command.get('x',None) is not None:       # X-coordinate
-                line += f" X{command['x']:.4f}"
-            if command.get('y',None) is not None:       # Y-coordinate
-                line += f" Y{command['y']:.4f}"
-            if command.get('z',None) is not None:       # Z-coordinate
-                line += f" Z{command['z']:.4f}"
-            if command.get('e',None) is not None:       # Extruder Position
-                line += f" E{command['e']:.4f}"
-            if command.get('i',None) is not None:       # Arc Center X-offset
-                line += f" I{command['i']:.4f}"
-            if command.get('j',None) is not None:       # Arc Center Y-offset
-                line += f" J{command['j']:.4f}"
-            if command.get('p',None) is not None:       # Number of helix turns
-                line += f" P{command['p']}"
-            if command.get('f',None) is not None:       # Feed Rate
-                line += f" F{command['f']:.4f}"
-            if command.get('s',None) is not None:       # Spindle RPM, Bed/Hotend Temperature
-                line += f" S{command['s']:.4f}"
-            if command.get('comment',None) is not None: # Human-readable comments
-                line += f"; {styles[command.get('style', '')]}{command.get('comment', '')}{ENDC}"
-            self.gcode_array.append(line)
-        self.gcode = "\n".join(self.gcode_array)
+# Generate G-code -- One line per queued command, followed by the End G-Code
+#
+# `profile` is one of PROFILES and defaults to Machine.profile.  Lean profiles
+# drop lines that were only ever comments instead of leaving them blank and,
+# unless Machine.elide is turned off, leave off words the controller already
+# has modal (see ModalState).  Debug output always spells everything out.
+#
+# Post-processing stages (see post_processors()) rewrite the command stream on
+# its way to the formatter, whatever the profile.  The stages used for the last
+# generation are kept in Machine.stages so you can see what they did.
+#
+# Lines are rendered as they are asked for and never all held in memory at
+# once.  With Machine.cache_gcode (the default), they are also spooled to disk
+# per profile (see Rendering), so only commands queued since the last
+# generation are formatted again.  Turn it off to render from scratch every
+# time without touching disk.
+################################################################################
+
+    def iter_gcode(self, profile=None):
+        if self._streamed:
+            raise ValueError(f"{RED}{self.name} streams its G-code to {self._sink_path or 'its sink'} as it is queued, so it cannot be generated again{ENDC}")
+        profile = profile or self.profile
+        self.note_renderer(profile) # Unknown profiles fail here
+        self.replay()
+        if self.cache_gcode:
+            rendering = yield from self.rendering(profile)
+            modal, self.stages = copy.deepcopy((rendering.modal, rendering.stages))
+            yield from self.render_queue(rendering.stop, rendering.stop, profile=profile, modal=modal, stages=self.stages)
+        else:
+            self.drop_renderings()
+            self.stages = self.post_processors()
+            yield from self.render_queue(0, len(self.command_queue), profile=profile, modal=self.modal_state(profile), stages=self.stages)
+        yield from self.stage_reports(self.stages, profile)
+        yield from self.end_gcode(profile)
+
+################################################################################
+# Machine.rendering(profile) -- Generator of the cached lines for `profile`,
+# followed by any new ones as they are rendered and cached.  Returns the
+# Rendering.
+#
+# If the caller stops part way through, the half-extended cache is dropped.
+################################################################################
+
+    def rendering(self, profile):
+        key = (self.elide, self.modal_motion, self.arc_tolerance, self.simplify_tolerance, tuple(self.formatter.precision.items()), self.formatter.vectorize)
+        rendering = self._renderings.get(profile)
+        if rendering is None or rendering.key != key or rendering.stop > len(self.command_queue):
+            if rendering is not None:
+                rendering.close()
+            rendering = self._renderings[profile] = Rendering(key, self.modal_state(profile), self.post_processors())
+        stop = len(self.command_queue)
+        yield from rendering.lines()
+        if rendering.stop < stop:
+            self._renderings.pop(profile)
+            lines = []
+            try:
+                for line in self.render_queue(rendering.stop, stop, profile=profile, modal=rendering.modal, stages=rendering.stages, final=False):
+                    lines.append(line)
+                    yield line
+                    if len(lines) >= 4096:
+                        rendering.extend(lines)
+                        lines = []
+            except BaseException:
+                rendering.close() # Abandoned part way, so of no use to anyone
+                raise
+            rendering.extend(lines)
+            rendering.stop = stop
+            self._renderings[profile] = rendering
+        return rendering
+
+    def drop_renderings(self):
+        for rendering in self._renderings.values():
+            rendering.close()
+        self._renderings = {}
+
+    def end_gcode(self, profile=None):
+        profile = profile or self.profile
+        for line in self.dict.get('End G-Code', []):
+            line = self.format_command({'code':line[0], 'comment':line[1]}, profile)
+            if line or profile == 'debug':
+                yield line
+
+    def modal_state(self, profile):
+        if self.elide and profile != 'debug':
+            return ModalState(self.formatter.precision, self.modal_motion)
+        return None
+
+    def render_queue(self, start, stop, lines=4096, profile='debug', modal=None, stages=(), final=True):
+        note = self.note_renderer(profile)
+        for queue, block_start, block_stop in self.queue_blocks(start, stop, lines, stages, final):
+            rendered = self.formatter.lines(queue, block_start, block_stop, note, modal)
+            if profile == 'debug':
+                yield from rendered
+            else:
+                yield from filter(None, rendered)
+
+    def queue_blocks(self, start, stop, lines, stages, final=True):
+        if not stages:
+            for block in range(start, stop, lines):
+                yield self.command_queue, block, min(block+lines, stop)
+            return
+        commands = (self.command_queue.row(n) for n in range(start, stop))
+        for stage in stages:
+            commands = stage.process(commands, final)
+        block = CommandQueue(itertools.islice(commands, lines))
+        while len(block):
+            yield block, 0, len(block)
+            block = CommandQueue(itertools.islice(commands, lines))
+
+################################################################################
+# Post-processing -- Optional stages between the command queue and the G-code
+#
+# Machine.arc_tolerance      -- Fit G2/G3 arcs to runs of G1 chords (see ArcFitter)
+# Machine.simplify_tolerance -- Drop nearly collinear G1 moves (see Simplifier)
+#
+# Each stage reports what it did in a comment at the end of the program.
+################################################################################
+
+    def post_processors(self):
+        stages = []
+        if self.arc_tolerance:
+            stages.append(ArcFitter(self.arc_tolerance))
+        if self.simplify_tolerance:
+            stages.append(Simplifier(self.simplify_tolerance))
+        return stages
+
+    def stage_reports(self, stages, profile):
+        for stage in stages:
+            line = self.format_command({'comment': stage.report(), 'style': 'machine'}, profile)
+            if line:
+                yield line
+
+    def format_command(self, command, profile='debug'):
+        return self.formatter.line(command, self.note_renderer(profile))
+
+    def note_renderer(self, profile):
+        if profile == 'debug':
+            return self.format_note
+        if profile == 'annotated':
+            return self.format_plain_note
+        if profile == 'production':
+            return lambda comment, style: ""
+        raise ValueError(f"{RED}Unknown output profile '{profile}'.  Options are: {PROFILES}{ENDC}")
+
+    def format_note(self, comment, style):
+        if comment is None: # Human-readable comments
+            return ""
+        return f"; {STYLES[style or '']}{comment}{ENDC}"
+
+    def format_plain_note(self, comment, style):
+        if comment is None or style not in ANNOTATED:
+            return ""
+        return f"; {comment}"
+
+    def generate_gcode(self, profile=None):
+        self.gcode = "\n".join(self.iter_gcode(profile))
+
+################################################################################
+# Stream G-code -- Newline-joined chunks of at most `lines` lines each, so
+# nothing downstream ever holds more than one chunk of the program
+################################################################################
+
+    def gcode_chunks(self, lines=4096, profile=None):
+        gcode = self.iter_gcode(profile)
+        chunk = list(itertools.islice(gcode, lines))
+        separator = ""
+        while chunk:
+            yield separator + "\n".join(chunk)
+            separator = "\n"
+            chunk = list(itertools.islice(gcode, lines))
+
+    def write_gcode(self, file, profile=None):
+        for chunk in self.gcode_chunks(profile=profile):
+            file.write(chunk)
+
+    def write_gcode_bytes(self, file, profile=None, compression=None):
+        with compressor(file, compression) as stream:
+            if self._streamed:
+                with open(self.streamed_path(), 'rb') as streamed:
+                    shutil.copyfileobj(streamed, stream)
+            else:
+                for chunk in self.gcode_chunks(profile=profile):
+                    stream.write(chunk.encode())
+
+    def spool_gcode(self, profile='production', compression=None):
+        if self._streamed and not compression:
+            return open(self.streamed_path(), 'rb')
+        spool = tempfile.TemporaryFile()
+        self.write_gcode_bytes(spool, profile, compression)
+        spool.seek(0)
+        return spool
 
 ################################################################################
 # Print G-code to stdout
 ################################################################################
 
     def print_gcode(self):
-        if not self.gcode:
-            self.generate_gcode()
-        print(self.gcode)
+        self.write_gcode(sys.stdout)
+        sys.stdout.write("\n")
 
 ################################################################################
 # Save G-code to File
 ################################################################################
 
-    def save_gcode(self, filename=script+'.nc'):
-        if not self.gcode:
-            self.generate_gcode()
-        with open(filename, 'w') as file:
-            file.write(self.gcode)
+    def save_gcode(self, filename=script+'.nc', profile='production', compression=None):
+        compression = compression or compression_for(filename)
+        with open(filename, 'wb') as file:
+            self.write_gcode_bytes(file, profile, compression)
+
+################################################################################
+# Save Binary -- The command stream itself, after post-processing, in the
+# compact format from binary.py.  `python -m pygdk.binary <file>` expands it
+# back into the same G-code save_gcode() would have written.
+################################################################################
+
+    def save_binary(self, filename=script+'.gcb', compression=None):
+        if self._streamed:
+            raise ValueError(f"{RED}{self.name} streamed its commands to {self._sink_path or 'its sink'} as they were queued, so there are none left to save{ENDC}")
+        self.replay()
+        compression = compression or compression_for(filename)
+        header = {'Name': self.name, 'Precision': self.formatter.precision, 'Modal Motion': self.modal_motion}
+        with open(filename, 'wb') as file, compressor(file, compression) as stream:
+            encoder = Encoder(stream, header)
+            self.stages = self.post_processors()
+            for queue, start, stop in self.queue_blocks(0, len(self.command_queue), 4096, self.stages):
+                encoder.write(queue, start, stop)
+            end = CommandQueue([{'code':line[0], 'comment':line[1]} for line in self.dict.get('End G-Code', [])])
+            encoder.write(end, 0, len(end))
+            encoder.close()
 
 ################################################################################
 # OctoPrint Helper
 ################################################################################
 
-    def octoprint(self, start=False, select=True):
+    def octoprint(self, start=False, select=True, profile='production', compression=None):
         print(f"{GREEN}Sending to OctoPrint{' and starting print' if start else ''}{ENDC}")
         host = self.controller.host
         api_key = self.controller.api_key
         if not host or not api_key:
             raise ValueError("You must configure `Hostname / IP` and `API Key` in the `Controller` section of your machine JSON before you can send to OctoPrint.  See https://github.com/cilynx/pygdk/tree/main/machines for configuration examples.")
-        if not self.gcode:
-            self.generate_gcode()
-        filename = os.path.basename(script)+'.g'
-        fle={'file': (filename, self.gcode)}
-        url=f"http://{host}/api/files/local"
-        payload={'select': select, 'print': start }
-        header={'X-Api-Key': api_key }
-        response = requests.post(url, files=fle,data=payload,headers=header)
+        compression = compression or self.controller.compression
+        filename = os.path.basename(script)+'.g'+(COMPRESSIONS[compression] if compression else '')
+        with self.spool_gcode(profile, compression) as spool:
+            fle={'file': (filename, spool)}
+            url=f"http://{host}/api/files/local"
+            payload={'select': select, 'print': start }
+            header={'X-Api-Key': api_key }
+            response = requests.post(url, files=fle,data=payload,headers=header)
         print(response.__dict__)
 
     OctoPrint = octoprint
@@ -854,15 +1215,16 @@ class Machine:
 # Buildbotics / Onefinity Helper
 ################################################################################
 
-    def buildbotics(self, start=False):
+    def buildbotics(self, start=False, profile='production', compression=None):
         print(f"{GREEN}Sending to Buildbotics Controller{' and starting job' if start else ''}{ENDC}")
         if not self.controller.host:
             raise ValueError("You must configure `Hostname / IP` in the `Controller` section of your machine JSON before you can send to your Buildbotics Controller.  See https://github.com/cilynx/pygdk/tree/main/machines for configuration examples.")
-        if not self.gcode:
-            self.generate_gcode()
         import os, requests
         filename = os.path.basename(sys.argv[0])+'.nc'
-        response = requests.put(f"http://{self.controller.host}/api/file/{filename}", data=self.gcode)
+        compression = compression or self.controller.compression
+        headers = {'Content-Encoding': compression} if compression else {}
+        with self.spool_gcode(profile, compression) as spool:
+            response = requests.put(f"http://{self.controller.host}/api/file/{filename}", data=spool, headers=headers)
         print(response.__dict__)
         if start:
             import time
@@ -933,7 +1295,10 @@ class Machine:
 
     def camotics(self, filename=sys.argv[0]+'.nc'):
         import os
-        self.save_gcode(filename)
+        if self._streamed:
+            filename = self.streamed_path()
+        else:
+            self.save_gcode(filename)
         os.system(f"camotics {filename}")
 
     CAMotics = camotics
@@ -16,8 +16,8 @@ ENDC   = '\033[0m'
 ################################################################################
 
 class Mill(Machine):
-    def __init__(self, json_file):
-        super().__init__(json_file)
+    def __init__(self, json_file, sink=None):
+        super().__init__(json_file, sink)
         self.queue(comment='Loading Mill parameters from JSON', style='mill')
         with open(f"machines/{json_file}") as f:
             dict = json.load(f)
@@ -38,7 +38,7 @@ class Mill(Machine):
 
     @css.setter
     def css(self, value):
-        self.queue(comment=f"Desired Constant Surface Speed (CSS): {value:.4f} m/s | {value*196.85:.4f} ft/min{ENDC}", style='mill')
+        self.queue(comment=f"Desired Constant Surface Speed (CSS): {value:.4f} m/s | {value*196.85:.4f} ft/min", style='mill')
         self.queue(comment=f"Calculating RPM from CSS and tool diameter.", style='mill')
         rpm = value * 60000 / math.pi / self.tool.diameter
         if rpm > self.max_rpm:
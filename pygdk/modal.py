@@ -0,0 +1,231 @@
+import array
+
+try:
+    import numpy
+except ImportError: # Vectorized elision is optional
+    numpy = None
+
+from .command_queue import WORDS, BITS
+from .formatter import quantized
+
+AXES = ('x', 'y', 'z')
+MOTION = ('G0', 'G1', 'G2', 'G3')
+LINEAR = ('G0', 'G1')
+KINDS = {'G90': 1, 'G91': 2, 'G0': 3, 'G1': 4, 'G2': 5, 'G3': 6} # Anything else is 0
+
+class ModalState:
+
+################################################################################
+# ModalState.__init__() -- What the controller already knows
+#
+# Tracks the motion mode, feed, distance mode, and position that have already
+# been sent, so words that wouldn't change anything can be left off.  Values
+# are compared after rounding to the precision they are written at, so "same"
+# means "same text on the wire".
+#
+# `modal_motion` allows leaving off a repeated G0/G1 word.  Not every firmware
+# supports that (Marlin doesn't by default), so it's up to the machine.
+################################################################################
+
+    def __init__(self, precision, modal_motion=True):
+        self.precision = precision
+        self.modal_motion = modal_motion
+        self.absolute = None
+        self.position = {}
+        self.reset()
+        self.vectorize = numpy is not None
+        self.min_block = 64
+
+    def reset(self):
+        self.motion = None
+        self.feed = None
+        for axis in AXES:
+            self.position[axis] = None
+
+################################################################################
+# ModalState.elide(mask, offset, values, codes, table) -- Drop redundant words
+#
+# Works on the raw CommandQueue.block() columns.  Returns a copy of `mask` with
+# the bits of elided words cleared, and sets elided codes in `codes` to -1 in
+# place.  `mask` itself is left alone, since it is what locates each row's
+# values.  Only G0/G1/G2/G3 rows are touched:
+#
+#   - F is dropped when it matches the last feed sent
+#   - X/Y/Z on G0/G1 are dropped when they match where we already are, and the
+#     whole move goes if that leaves nothing to do
+#   - G0/G1 are dropped when the motion mode is already set (modal_motion)
+#
+# Arcs always keep their G-word and axes.  E is never touched since it may be
+# relative.  Any other code (M6, G28, G92, M72, Start G-Code, ...) could change
+# what the controller thinks, so it forgets everything but the distance mode.
+#
+# Big blocks go through NumPy when it is available.  Both paths make the same
+# decisions and leave the same state behind for the next block.
+################################################################################
+
+    def elide(self, mask, offset, values, codes, table):
+        if self.vectorize and len(mask) >= self.min_block:
+            return self._vector_elide(mask, offset, values, codes, table)
+        return self._scalar_elide(mask, offset, values, codes, table)
+
+    def _scalar_elide(self, mask, offset, values, codes, table):
+        base = offset[0] if len(offset) else 0
+        emit = array.array('H', mask)
+        precision = self.precision
+        position = self.position
+        for n in range(len(mask)):
+            if codes[n] < 0:
+                continue
+            code = table[codes[n]]
+            if code not in MOTION:
+                word = code.split(' ')[0]
+                if word == 'G90':
+                    self.absolute = True
+                elif word == 'G91':
+                    self.absolute = False
+                self.reset()
+                continue
+            bits = mask[n]
+            keep = bits
+            feed = self.feed
+            moved = False
+            stays = False
+            target = {}
+            i = offset[n] - base
+            for word in WORDS:
+                if bits & BITS[word]:
+                    value = values[i]
+                    i += 1
+                    if word in AXES:
+                        target[word] = round(value, precision[word])
+                        if code in LINEAR and self.absolute and target[word] == position[word]:
+                            keep &= ~BITS[word]
+                            stays = True
+                        else:
+                            moved = True
+                    elif word == 'f':
+                        value = round(value, precision['f'])
+                        if value == feed:
+                            keep &= ~BITS['f']
+                        feed = value
+                    else:
+                        moved = True
+            if code in LINEAR and stays and not moved: # Already there
+                emit[n] = 0
+                codes[n] = -1
+                continue
+            for axis in target:
+                position[axis] = target[axis] if self.absolute else None
+            if not self.absolute:
+                for axis in AXES:
+                    position[axis] = None
+            self.feed = feed
+            emit[n] = keep
+            if self.modal_motion and code in LINEAR and code == self.motion:
+                codes[n] = -1
+            self.motion = code
+        return emit
+
+################################################################################
+# Vector Path -- The same state machine, one column at a time
+#
+# Every code other than G0-G3 resets the state, so the rows split into segments
+# that start at those codes.  Within a segment, "what the controller already
+# has" for a word is just the last value given for it, which is a running max
+# over row indices.  Rows before the first reset carry on from the last block.
+################################################################################
+
+    def _vector_elide(self, mask, offset, values, codes, table):
+        emit = array.array('H', mask)
+        codes = numpy.frombuffer(codes, dtype=numpy.int32)
+        rows = numpy.flatnonzero(codes >= 0)
+        if not len(rows):
+            return emit
+        unique, inverse = numpy.unique(codes[rows], return_inverse=True)
+        kind = numpy.array([classify(table[code]) for code in unique.tolist()], dtype=numpy.int64)[inverse]
+        index = numpy.arange(len(rows))
+        start = numpy.maximum.accumulate(numpy.where(kind <= 2, index, -1))
+        carried = start < 0
+
+        def previous(flags): # Last flagged row before each row, in the same segment
+            last = numpy.maximum.accumulate(numpy.where(flags, index, -1))
+            last = numpy.concatenate(([-1], last[:-1]))
+            return numpy.where(last > start, last, -1)
+
+        def before(flags, keys, state): # What the controller had when each row came up
+            last = previous(flags)
+            state = numpy.nan if state is None else state
+            return numpy.where(last >= 0, keys[last], numpy.where(carried, state, numpy.nan))
+
+        distance = numpy.where(kind == 1, 1, numpy.where(kind == 2, 0, -1))
+        last = numpy.maximum.accumulate(numpy.where(distance >= 0, index, -1))
+        absolute = numpy.where(last >= 0, distance[last], 1 if self.absolute else 0) == 1
+        motion = kind >= 3
+        linear = (kind == 3) | (kind == 4)
+
+        mask = numpy.frombuffer(mask, dtype=numpy.uint16)[rows]
+        where = numpy.frombuffer(offset, dtype=numpy.uint32).astype(numpy.int64)
+        where = where[rows] - where[0]
+        values = numpy.frombuffer(values, dtype=numpy.float64)
+        keep = mask.copy()
+        moved = numpy.zeros(len(rows), dtype=bool)
+        stays = numpy.zeros(len(rows), dtype=bool)
+        keys = {}
+        for bit, word in enumerate(WORDS):
+            present = (mask >> bit) & 1 == 1
+            given = present & motion
+            if word in AXES or word == 'f':
+                key = numpy.full(len(rows), numpy.nan)
+                key[given] = quantized(values[where[given]], self.precision[word])
+                keys[word] = (given, key)
+            if word in AXES:
+                same = given & linear & absolute & (key == before(given, key, self.position[word]))
+                keep[same] &= 0xFFFF ^ BITS[word]
+                stays |= same
+                moved |= given & ~same
+            elif word != 'f':
+                moved |= given
+            where += present
+        noop = linear & stays & ~moved # Already there
+        sent = motion & ~noop
+
+        given, key = keys['f']
+        given = given & sent
+        keep[given & (key == before(given, key, self.feed))] &= 0xFFFF ^ BITS['f']
+        modal = numpy.zeros(len(rows), dtype=bool)
+        if self.modal_motion:
+            modal = sent & linear & (kind == before(sent, kind.astype(numpy.float64), KINDS.get(self.motion)))
+        keep[noop] = 0
+        numpy.frombuffer(emit, dtype=numpy.uint16)[rows] = keep
+        codes[rows[noop | modal]] = -1
+
+        # Leave behind whatever the last segment left the controller with
+        last = numpy.flatnonzero(distance >= 0)
+        if len(last):
+            self.absolute = bool(distance[last[-1]])
+        final = index > start[-1]
+        if not carried[-1]:
+            self.reset()
+        for axis in AXES:
+            given, key = keys[axis]
+            given = numpy.flatnonzero(given & final)
+            if len(given):
+                self.position[axis] = float(key[given[-1]]) if self.absolute else None
+        given, key = keys['f']
+        given = numpy.flatnonzero(given & sent & final)
+        if len(given):
+            self.feed = float(key[given[-1]])
+        given = numpy.flatnonzero(sent & final)
+        if len(given):
+            self.motion = MOTION[kind[given[-1]] - 3]
+        return emit
+
+################################################################################
+# classify(code) -- KINDS value for a code string
+################################################################################
+
+def classify(code):
+    if code in MOTION:
+        return KINDS[code]
+    word = code.split(' ')[0]
+    return KINDS[word] if word in ('G90', 'G91') else 0
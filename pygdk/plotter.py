@@ -1,6 +1,8 @@
 import json
+from concurrent.futures import ProcessPoolExecutor
 
 from .machine import Machine
+from .tour import plan
 
 RED    = '\033[31m'
 ORANGE = '\033[91m'
@@ -14,8 +16,8 @@ ENDC   = '\033[0m'
 ################################################################################
 
 class Plotter(Machine):
-    def __init__(self, json_file):
-        super().__init__(json_file)
+    def __init__(self, json_file, sink=None):
+        super().__init__(json_file, sink)
         self.queue(comment='Loading Plotter parameters from JSON', style='plotter')
         if 'Plotter' not in self.dict:
             raise KeyError(f"Machine config does not include Plotter.  See https://github.com/cilynx/pygdk/blob/main/onefinity.json for an example Plotter config.")
@@ -27,6 +29,11 @@ class Plotter(Machine):
 
         self.safe_z = self._plotter['Z-Stage']
         self.z_draw = self._plotter['Z-Touch']
+        self.dedup_tolerance = None
+        self.chain_tolerance = 0.001
+        self.improve_budget = None
+        self.processes = 1
+        self.pen_up_travel = {} # Color -> (mm before improving, mm after)
 
 ################################################################################
 # Pen Color
@@ -40,6 +47,7 @@ class Plotter(Machine):
     def pen_color(self, value):
         if not self._plotter:
             raise ValueError(f"{RED}You must configure a Plotter before you can set pen_color{ENDC}")
+        self.replay()
 
         if self._optimize:
             if value is None:
@@ -78,39 +86,43 @@ class Plotter(Machine):
 
 ################################################################################
 # Optimize Linear Moves
+#
+# With dedup_tolerance set (mm), any part of a line that retraces one already
+# queued in the same color is dropped (see tour.dedup()).  Dropping retraces
+# can break one continuous stroke into many, so it's off by default.
+#
+# Lines that meet within chain_tolerance (mm) are drawn as one stroke, without
+# lifting the pen in between.  Set it to None to draw every line on its own.
+#
+# With improve_budget set, each color's tour then gets up to that many seconds
+# of 2-opt/Or-opt to shorten its pen-up travel (see tour.improve()).
+#
+# Colors don't depend on each other, so with processes set to anything but 1
+# they're planned in a process pool of that size (None for one per core).
+# Colors are still drawn in the order they were first used.
 ################################################################################
 
-
     def optimize_linear_moves(self):
         self._optimize = False
         turtle = self.turtle(verbose=True, z_draw=self.dict['Plotter']['Z-Touch'])
-        for color in self._linear_moves:
-            if color:
-                self.pen_color = color
-                pos = self._plotter['Slot Zero']
-                remaining_points = self._linear_moves[color]
-                while remaining_points:
-                    shortest = None
-                    winner = None
-                    for pair in remaining_points:
-                        for point in pair:
-                            ds = dsq(pos, point)
-                            if shortest is None or ds < shortest:
-                                shortest = ds
-                                winner = pair
-                    remaining_points.remove(winner)
-                    points = order(winner, pos)
-                    turtle.penup()
-                    turtle.goto(points[0][0], points[0][1], comment="Rapid to next start")
-                    turtle.pendown()
-                    turtle.goto(points[1][0], points[1][1], comment="Draw next line")
-                    pos = points[1]
-                    # self.rapid(move[0][0], move[0][1], move[0][2], comment="Rapid to next start")
-                    # self.linear_interpolation(move[1][0], move[1][1], move[1][2], comment="Execute move")
-
-def dsq(a, b):
-    return (b[0]-a[0])**2 + (b[1]-a[1])**2
-
-def order(pair, pos):
-#    print(pair if dsq(pos, pair[0]) < dsq(pos, pair[1]) else [pair[1], pair[0]])
-    return pair if dsq(pos, pair[0]) < dsq(pos, pair[1]) else [pair[1], pair[0]]
+        colors = [color for color in self._linear_moves if color]
+        jobs = [(self._linear_moves[color], self._plotter['Slot Zero'], self.chain_tolerance, self.improve_budget, self.dedup_tolerance) for color in colors]
+        if self.processes != 1 and len(colors) > 1:
+            with ProcessPoolExecutor(self.processes) as pool:
+                plans = list(pool.map(plan, *zip(*jobs)))
+        else:
+            plans = [plan(*job) for job in jobs]
+        for color, (tour, travel) in zip(colors, plans):
+            self.pen_color = color
+            if travel:
+                self.pen_up_travel[color] = travel
+                self.queue(comment=f"{color} pen-up travel: {travel[0]:.1f} mm greedy, {travel[1]:.1f} mm improved", style='plotter')
+            self._linear_moves[color] = []
+            for points in tour:
+                turtle.penup()
+                turtle.goto(points[0][0], points[0][1], comment="Rapid to next start")
+                turtle.pendown()
+                for point in points[1:]:
+                    turtle.goto(point[0], point[1], comment="Draw next line")
+                # self.rapid(move[0][0], move[0][1], move[0][2], comment="Rapid to next start")
+                # self.linear_interpolation(move[1][0], move[1][1], move[1][2], comment="Execute move")
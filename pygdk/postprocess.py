@@ -0,0 +1,117 @@
+RED  = '\033[31m' # Red
+ENDC = '\033[0m'  # End Color
+
+MOTION = ('G0', 'G1', 'G2', 'G3')
+
+################################################################################
+# Post-processing Stages
+#
+# A stage rewrites the command stream between the command queue and the
+# formatter, one run of cutting/drawing moves at a time.  Subclasses say which
+# commands can join a run (extends) and what to do with a finished run (fit);
+# this base class gathers the runs and follows along with where the machine
+# is, so every run starts from a known point.
+#
+# A run is never held longer than `window` commands.  Once it gets there, the
+# stage lets go of what it can (see settle()), so memory stays flat however
+# long the run is.
+################################################################################
+
+class Stage:
+
+    window = 4096
+
+    def __init__(self, tolerance):
+        if tolerance <= 0:
+            raise ValueError(f"{RED}{type(self).__name__} tolerance must be positive, not {tolerance}{ENDC}")
+        self.tolerance = tolerance
+        self.absolute = None
+        self.position = None
+        self.plane = None
+        self.extrusion = None # 'M82' absolute or 'M83' relative, once we know
+        self.e = None         # Last absolute E, if extrusion is absolute
+        self.run = []         # Commands waiting on the rest of their run
+
+################################################################################
+# Stage.process(commands, final=True) -- Generator of rewritten commands
+#
+# With final=False, the run still open at the end of `commands` is held back
+# so the next call can keep adding to it.  Output is the same as processing
+# everything in one go.
+################################################################################
+
+    def process(self, commands, final=True):
+        for command in commands:
+            if self.run and self.extends(self.run, command):
+                self.run.append(command)
+                if len(self.run) >= self.window:
+                    yield from self.settle()
+                continue
+            yield from self.flush()
+            if self.extends(self.run, command):
+                self.run.append(command)
+            else:
+                self.track(command)
+                yield command
+        if final:
+            yield from self.flush()
+
+    def flush(self):
+        run, self.run = self.run, []
+        yield from self.fit(run)
+
+################################################################################
+# Stage.settle() -- Let go of as much of a full window as the stage can
+#
+# By default the window is fitted as a run of its own, and the next command
+# starts a new run from where it ended.  Stages that only ever look a bounded
+# distance ahead can do better and keep the tail of the run open.
+################################################################################
+
+    def settle(self):
+        yield from self.flush()
+
+    def extends(self, run, command):
+        return False
+
+    def fit(self, run):
+        for command in run:
+            self.track(command)
+            yield command
+
+    def report(self):
+        return None
+
+################################################################################
+# Stage.track(command) -- Follow along with what the controller is doing
+#
+# Anything we don't understand (G28, G92, M6, ...) could move the machine or
+# change its coordinates, so the position is forgotten until the next move
+# that sets every axis.
+################################################################################
+
+    def track(self, command):
+        code = command.get('code')
+        if code is None:
+            return
+        if code in MOTION:
+            if not self.absolute:
+                self.position = None
+                return
+            position = self.position or (None, None, None)
+            position = tuple(position[n] if command.get(axis) is None else command[axis] for n, axis in enumerate('xyz'))
+            self.position = None if None in position else position
+            if command.get('e') is not None:
+                self.e = command['e'] if self.extrusion == 'M82' else None
+        elif code in ('G17', 'G18', 'G19'):
+            self.plane = code
+        elif code in ('G90', 'G91'):
+            self.absolute = code == 'G90'
+            if not self.absolute:
+                self.position = None
+        elif code in ('M82', 'M83'):
+            self.extrusion = code
+            self.e = None
+        else:
+            self.position = None
+            self.e = None
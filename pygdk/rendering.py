@@ -0,0 +1,61 @@
+import tempfile
+
+################################################################################
+# Rendering -- G-code lines already rendered for one output profile
+#
+# Lines are only ever added for commands queued since the last time around, so
+# printing, saving, and uploading the same job costs one formatting pass per
+# profile in total.  The lines themselves are spooled to a temporary file
+# rather than kept in memory, so a cached program costs disk, not RAM, however
+# long it is.  The modal state and post-processing stages are kept as they
+# were at the end of the cached lines; the open tail of a stage run and the
+# epilogue (stage reports, End G-Code) are rendered fresh from copies every
+# time.
+#
+# `key` holds the settings the lines were rendered with.  If any of them change,
+# or the queue no longer holds what was rendered, the lines are thrown away.
+################################################################################
+
+class Rendering:
+
+    def __init__(self, key, modal, stages):
+        self.key = key
+        self.modal = modal
+        self.stages = stages
+        self.stop = 0 # Queued commands rendered so far
+        self.file = tempfile.TemporaryFile()
+        self.size = 0 # Bytes of lines in file
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def extend(self, lines):
+        if lines:
+            data = "".join(line + "\n" for line in lines).encode()
+            self.file.seek(self.size)
+            self.file.write(data)
+            self.size += len(data)
+            self.count += len(lines)
+
+################################################################################
+# Rendering.lines(chunk=65536) -- Generator of the cached lines
+#
+# Reads `chunk` bytes at a time and seeks before every read, so more than one
+# of these can be going at once, and lines added after it started are left
+# for the next time around.
+################################################################################
+
+    def lines(self, chunk=65536):
+        position, end = 0, self.size
+        rest = b""
+        while position < end:
+            self.file.seek(position)
+            data = self.file.read(min(chunk, end - position))
+            position += len(data)
+            *lines, rest = (rest + data).split(b"\n")
+            for line in lines:
+                yield line.decode()
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,112 @@
+import math
+
+try:
+    import numpy
+except ImportError: # Vectorized distances are optional
+    numpy = None
+
+from .postprocess import Stage
+
+################################################################################
+# Polyline Simplification -- Douglas-Peucker over each cutting/drawing run
+#
+# Raster heightmaps, dense L-systems, and calibration patterns produce lots of
+# collinear or nearly collinear G1 moves.  Simplifier collects runs of absolute
+# G1 moves at the same feed and drops every move it can while keeping each
+# dropped point within `tolerance` of the segment that replaces it.  That's the
+# guaranteed maximum deviation.
+#
+# With absolute extrusion (M82), E is simplified along with X/Y/Z as a fourth
+# coordinate, so the filament laid down can't drift by more than `tolerance`
+# either.  With relative or unknown extrusion, moves with E are left alone.
+#
+# Runs longer than the stage window are simplified a window at a time, which
+# keeps one extra move at each window boundary and nothing else changes.
+################################################################################
+
+class Simplifier(Stage):
+
+    def __init__(self, tolerance):
+        super().__init__(tolerance)
+        self.segments = 0 # G1 moves seen in runs
+        self.removed = 0  # ... and dropped
+
+    def extends(self, run, command):
+        if command.get('code') != 'G1' or not self.absolute or self.position is None:
+            return False
+        if any(command.get(word) is not None for word in command if word not in ('code', 'x', 'y', 'z', 'e', 'f', 'comment', 'style')):
+            return False
+        if command.get('e') is not None and (self.extrusion != 'M82' or (not run and self.e is None)):
+            return False
+        if not run:
+            return True
+        return command.get('f') == run[0].get('f') and (command.get('e') is None) == (run[0].get('e') is None)
+
+    def report(self):
+        return f"Simplification removed {self.removed} of {self.segments} moves"
+
+################################################################################
+# Simplifier.fit(run) -- Keep only the moves Douglas-Peucker needs
+#
+# Kept moves are written out with every axis, since the move they used to
+# follow might be gone.
+################################################################################
+
+    def fit(self, run):
+        if not run:
+            return
+        axes = 'xyze' if run[0].get('e') is not None else 'xyz'
+        points = [self.position + ((self.e,) if axes == 'xyze' else ())]
+        for command in run:
+            points.append(tuple(points[-1][n] if command.get(axis) is None else command[axis] for n, axis in enumerate(axes)))
+        keep = douglas_peucker(points, self.tolerance)
+        self.segments += len(run)
+        for command, point, kept in zip(run, points[1:], keep[1:]):
+            if kept:
+                command = dict(command, x=point[0], y=point[1], z=point[2])
+                self.track(command)
+                yield command
+            else:
+                self.removed += 1
+
+################################################################################
+# douglas_peucker(points, tolerance) -- Which points to keep
+#
+# The first and last points are always kept.  Every dropped point is within
+# `tolerance` of the segment between the kept points on either side of it.
+################################################################################
+
+def douglas_peucker(points, tolerance):
+    keep = [False]*len(points)
+    keep[0] = keep[-1] = True
+    if numpy is not None:
+        array = numpy.array(points, dtype=float)
+    stack = [(0, len(points)-1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        if numpy is not None and last - first > 32:
+            distances = segment_distances(array[first+1:last], array[first], array[last])
+            index = int(numpy.argmax(distances))
+            worst, index = distances[index], first+1+index
+        else:
+            worst, index = max((segment_distance(points[n], points[first], points[last]), n) for n in range(first+1, last))
+        if worst > tolerance:
+            keep[index] = True
+            stack += [(first, index), (index, last)]
+    return keep
+
+def segment_distance(point, start, end):
+    direction = [b-a for a, b in zip(start, end)]
+    offset = [p-a for a, p in zip(start, point)]
+    length = sum(d*d for d in direction)
+    t = 0 if length == 0 else min(1, max(0, sum(d*o for d, o in zip(direction, offset))/length))
+    return math.sqrt(sum((o-t*d)**2 for d, o in zip(direction, offset)))
+
+def segment_distances(points, start, end):
+    direction = end - start
+    offset = points - start
+    length = direction @ direction
+    t = numpy.zeros(len(points)) if length == 0 else numpy.clip(offset @ direction / length, 0, 1)
+    return numpy.sqrt(((offset - t[:, None]*direction)**2).sum(axis=1))
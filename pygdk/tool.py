@@ -1,3 +1,5 @@
+import math
+
 RED  = '\033[31m' # Red
 YELLOW = '\033[93m' # Yellow
 ENDC  = '\033[0m'  # End Color
@@ -134,3 +136,45 @@ class Tool:
     @property
     def rpm(self):
         return self._rpm
+
+################################################################################
+# Tool.shape -- 'cylindrical', 'ballnose', or 'conical'
+################################################################################
+
+    @property
+    def shape(self):
+        return self._shape
+
+################################################################################
+# Tool.profile(r) -- How far above its tip the tool's cutting surface is, r mm
+# out from its axis
+#
+# Flat end mills are flat, ball noses are a sphere of the tool's radius, and
+# conical tools rise by their length over their radius.
+################################################################################
+
+    def profile(self, r):
+        if self._shape == 'cylindrical':
+            return 0
+        if self._shape == 'ballnose':
+            return self.radius - math.sqrt(max(0, self.radius**2 - r**2))
+        if self._shape == 'conical':
+            return r*self.length/self.radius
+        raise ValueError(f"{RED}Tool.profile doesn't know the shape of {self._shape} tools.  Options are: ['cylindrical', 'ballnose', 'conical']{ENDC}")
+
+################################################################################
+# Tool.footprint(res) -- [(dy, dx, lift)] for every pixel under the tool
+#
+# `res` is pixels per mm.  Each pixel within the tool's radius of the center is
+# listed as its offset from the center pixel and the profile() height there.
+################################################################################
+
+    def footprint(self, res):
+        n = int(self.radius*res)
+        footprint = []
+        for dy in range(-n, n+1):
+            for dx in range(-n, n+1):
+                r = math.hypot(dx, dy)/res
+                if r <= self.radius:
+                    footprint.append((dy, dx, self.profile(r)))
+        return footprint
@@ -0,0 +1,521 @@
+import math
+import time
+
+################################################################################
+# Plot Ordering -- Which stroke to draw next
+#
+# Plotter.optimize_linear_moves() draws each color's strokes greedily: from
+# where the pen is, go to the closest end of any stroke not yet drawn, draw it,
+# repeat.  Ties go to the stroke that was queued first.  A stroke is a list of
+# points drawn without lifting the pen; a plain [start, end] line is the
+# shortest kind.
+################################################################################
+
+def dsq(a, b):
+    return (b[0]-a[0])**2 + (b[1]-a[1])**2
+
+def order(stroke, pos):
+    return stroke if dsq(pos, stroke[0]) < dsq(pos, stroke[-1]) else stroke[::-1]
+
+def ends(stroke):
+    return (stroke[0], stroke[-1])
+
+################################################################################
+# greedy(strokes, pos) -- The greedy tour of `strokes` from `pos`, as a list of
+# strokes turned to be drawn in that direction
+#
+# Same tour as scanning every remaining stroke for every step, but each step
+# only looks at strokes near the pen (see Grid).
+################################################################################
+
+def greedy(strokes, pos):
+    grid = Grid(strokes)
+    tour = []
+    for _ in range(len(strokes)):
+        n = grid.nearest(pos)
+        grid.remove(n)
+        points = order(strokes[n], pos)
+        tour.append(points)
+        pos = points[-1]
+    return tour
+
+################################################################################
+# plan(lines, pos, chain_tolerance=None, budget=None, dedup_tolerance=None) --
+# Everything the plotter does to order one color: dedup, chain, greedy, and
+# improve if there's a budget
+#
+# Returns (tour, (travel before improving, travel after)), with None for the
+# travel if there was no budget.  Top-level so a process pool can run it.
+################################################################################
+
+def plan(lines, pos, chain_tolerance=None, budget=None, dedup_tolerance=None):
+    if dedup_tolerance:
+        lines = dedup(lines, dedup_tolerance)
+    strokes = chain(lines, chain_tolerance) if chain_tolerance else lines
+    tour = greedy(strokes, pos)
+    if not budget:
+        return tour, None
+    before = travel(tour, pos)
+    tour = improve(tour, pos, budget)
+    return tour, (before, travel(tour, pos))
+
+################################################################################
+# dedup(pairs, tolerance) -- Drop lines, or the parts of lines, already drawn
+#
+# Turtle programs that go forward() and then back() draw every line twice, and
+# the second pass only bleeds more ink.  Going through the lines in queue
+# order, any part of a line that runs within `tolerance` (in XY) along a line
+# kept before it is dropped, whichever way it was drawn.  What's left of a line
+# is kept as one or two shorter lines.  Lines nothing overlaps come back as is.
+################################################################################
+
+def dedup(pairs, tolerance):
+    index = Lines(pairs, tolerance)
+    kept = []
+    for pair in pairs:
+        pieces = [pair]
+        for n in index.nearby(pair):
+            pieces = [rest for piece in pieces for rest in uncovered(piece, kept[n], tolerance)]
+            if not pieces:
+                break
+        for piece in pieces:
+            index.add(piece, len(kept))
+            kept.append(piece)
+    return kept
+
+################################################################################
+# uncovered(line, cover, tolerance) -- The parts of `line` that `cover` doesn't
+# already draw, as a list of zero, one, or two lines
+#
+# `line` only counts as running along `cover` if both its ends are within
+# `tolerance` of the infinite line through `cover`.  Positions are then
+# compared along `cover`, from 0 at its start to its length at its end.
+################################################################################
+
+def uncovered(line, cover, tolerance):
+    p, q = line
+    a, b = cover
+    length = math.sqrt(dsq(a, b))
+    if length <= tolerance:
+        return [] if dsq(a, p) <= tolerance**2 and dsq(a, q) <= tolerance**2 else [line]
+    u = ((b[0]-a[0])/length, (b[1]-a[1])/length)
+    for point in (p, q):
+        if abs(u[0]*(point[1]-a[1]) - u[1]*(point[0]-a[0])) > tolerance:
+            return [line]
+    tp = u[0]*(p[0]-a[0]) + u[1]*(p[1]-a[1])
+    tq = u[0]*(q[0]-a[0]) + u[1]*(q[1]-a[1])
+    if abs(tq-tp) <= tolerance:
+        return [] if -tolerance <= min(tp, tq) and max(tp, tq) <= length+tolerance else [line]
+    if max(tp, tq) <= 0 or min(tp, tq) >= length:
+        return [line]
+
+    def at(t):
+        if t == tp:
+            return p
+        if t == tq:
+            return q
+        return [c+(d-c)*(t-tp)/(tq-tp) for c, d in zip(p, q)]
+
+    rest = []
+    lo, hi = (tp, tq) if tp < tq else (tq, tp)
+    for start, end in ((lo, min(hi, 0)), (max(lo, length), hi)):
+        if end - start > tolerance:
+            rest.append([at(start), at(end)] if tp < tq else [at(end), at(start)])
+    return rest
+
+################################################################################
+# Lines -- Kept lines listed in every grid cell they pass near, for dedup()
+#
+# Cells are about as big as the average line, and a line is listed in the
+# cells around every point along it, half a cell apart, so anything within
+# `tolerance` of it is found in the cells its own points fall in.
+################################################################################
+
+class Lines:
+
+    def __init__(self, pairs, tolerance):
+        total = sum(math.sqrt(dsq(p, q)) for p, q in pairs)
+        self.size = max(total/len(pairs) if pairs else 0, 4*tolerance)
+        self.cells = {}
+
+    def cells_along(self, pair):
+        p, q = pair
+        steps = int(math.sqrt(dsq(p, q))/(self.size/2)) + 1
+        keys = set()
+        for k in range(steps+1):
+            keys.add((math.floor((p[0]+(q[0]-p[0])*k/steps)/self.size), math.floor((p[1]+(q[1]-p[1])*k/steps)/self.size)))
+        return keys
+
+    def add(self, pair, n):
+        for i0, j0 in self.cells_along(pair):
+            for key in ((i, j) for i in (i0-1, i0, i0+1) for j in (j0-1, j0, j0+1)):
+                self.cells.setdefault(key, []).append(n)
+
+    def nearby(self, pair):
+        found = set()
+        for key in self.cells_along(pair):
+            found.update(self.cells.get(key, ()))
+        return sorted(found)
+
+################################################################################
+# chain(pairs, tolerance) -- Join lines that share an end into strokes
+#
+# Turtle polygons and circles reach the optimizer as one [start, end] line per
+# side, so drawn one by one every side costs a pen lift.  Starting from each
+# line not yet used, in queue order, keep adding the first queued unused line
+# with an end within `tolerance` (in XY) of the stroke's tail, then do the same
+# off its head.  Lines are turned around as needed.
+################################################################################
+
+def chain(pairs, tolerance):
+    index = Ends(pairs, tolerance)
+    strokes = []
+    for n, pair in enumerate(pairs):
+        if not index.alive[n]:
+            continue
+        index.alive[n] = 0
+        forward = index.follow(pair[-1])
+        backward = index.follow(pair[0])
+        strokes.append(backward[::-1] + [pair[0], pair[-1]] + forward)
+    return strokes
+
+################################################################################
+# Ends -- Line ends hashed into tolerance-sized cells, for chain()
+################################################################################
+
+class Ends:
+
+    def __init__(self, pairs, tolerance):
+        self.pairs = pairs
+        self.tolerance = tolerance
+        self.alive = bytearray(b'\x01')*len(pairs)
+        self.cells = {}
+        for n, pair in enumerate(pairs):
+            for end, point in enumerate(ends(pair)):
+                self.cells.setdefault(self.cell(point), []).append((n, end))
+
+    def cell(self, point):
+        if not self.tolerance:
+            return (point[0], point[1])
+        return (math.floor(point[0]/self.tolerance), math.floor(point[1]/self.tolerance))
+
+    def match(self, point):
+        i0, j0 = self.cell(point)
+        keys = [(i0, j0)] if not self.tolerance else [(i, j) for i in (i0-1, i0, i0+1) for j in (j0-1, j0, j0+1)]
+        winner = None
+        for key in keys:
+            cell = self.cells.get(key)
+            if not cell:
+                continue
+            cell[:] = [entry for entry in cell if self.alive[entry[0]]]
+            for n, end in cell:
+                if (winner is None or n < winner[0]) and dsq(point, self.pairs[n][-end]) <= self.tolerance**2:
+                    winner = (n, end)
+        return winner
+
+    def follow(self, point):
+        points = []
+        while True:
+            winner = self.match(point)
+            if winner is None:
+                return points
+            n, end = winner
+            self.alive[n] = 0
+            point = self.pairs[n][-1 if end == 0 else 0]
+            points.append(point)
+
+################################################################################
+# Grid -- Uniform grid over stroke ends, for nearest-stroke lookups
+#
+# Each cell lists the (stroke number, endpoint) pairs that fall in it.  Drawn
+# strokes are only marked dead and dropped from their cells the next time a
+# lookup passes through, and once most strokes are gone the grid is rebuilt
+# around what's left so lookups don't wade through empty cells.
+################################################################################
+
+class Grid:
+
+    def __init__(self, strokes):
+        self.strokes = strokes
+        self.alive = bytearray(b'\x01')*len(strokes)
+        self.count = len(strokes)
+        self.build(range(len(strokes)))
+
+    def build(self, numbers):
+        numbers = list(numbers)
+        self.indexed = len(numbers)
+        xs = [point[0] for n in numbers for point in ends(self.strokes[n])]
+        ys = [point[1] for n in numbers for point in ends(self.strokes[n])]
+        if not numbers:
+            self.cells = {}
+            return
+        self.x0, self.y0 = min(xs), min(ys)
+        extent = max(max(xs)-self.x0, max(ys)-self.y0)
+        self.size = extent/math.sqrt(len(numbers)) if extent > 0 else 1
+        self.cells = {}
+        for n in numbers:
+            for point in ends(self.strokes[n]):
+                self.cells.setdefault(self.cell(point), []).append((n, point))
+        keys = self.cells.keys()
+        self.span = (min(i for i, j in keys), max(i for i, j in keys), min(j for i, j in keys), max(j for i, j in keys))
+
+    def cell(self, point):
+        return (math.floor((point[0]-self.x0)/self.size), math.floor((point[1]-self.y0)/self.size))
+
+    def remove(self, n):
+        self.alive[n] = 0
+        self.count -= 1
+        if self.count and self.count*4 < self.indexed:
+            self.build(n for n in range(len(self.strokes)) if self.alive[n])
+
+################################################################################
+# Grid.nearest(pos) -- Number of the live stroke with an end closest to `pos`
+#
+# Searches rings of cells outward from the one `pos` is in.  Anything past
+# ring r is more than r cells away in x or y, so once the best so far is
+# closer than that, nothing further out can beat it (or tie it).
+################################################################################
+
+    def nearest(self, pos):
+        i0, j0 = self.cell(pos)
+        left, right, bottom, top = self.span
+        first = max(0, left-i0, i0-right, bottom-j0, j0-top) # Rings closer in miss the grid
+        last = max(i0-left, right-i0, j0-bottom, top-j0)
+        best = None
+        winner = None
+        alive = self.alive
+        for r in range(first, last+1):
+            for key in ring(i0, j0, r, self.span):
+                cell = self.cells.get(key)
+                if not cell:
+                    continue
+                dead = False
+                for n, point in cell:
+                    if not alive[n]:
+                        dead = True
+                        continue
+                    ds = dsq(pos, point)
+                    if best is None or ds < best or (ds == best and n < winner):
+                        best = ds
+                        winner = n
+                if dead:
+                    cell[:] = [entry for entry in cell if alive[entry[0]]]
+            if best is not None and (r*self.size*(1-1e-9))**2 > best:
+                break
+        return winner
+
+################################################################################
+# Grid.near(pos, k) -- Up to k (stroke number, squared distance) pairs for the
+# live strokes with an end closest to `pos`, closest first
+################################################################################
+
+    def near(self, pos, k):
+        i0, j0 = self.cell(pos)
+        left, right, bottom, top = self.span
+        first = max(0, left-i0, i0-right, bottom-j0, j0-top)
+        last = max(i0-left, right-i0, j0-bottom, top-j0)
+        found = {}
+        for r in range(first, last+1):
+            for key in ring(i0, j0, r, self.span):
+                for n, point in self.cells.get(key, ()):
+                    if self.alive[n]:
+                        ds = dsq(pos, point)
+                        if n not in found or ds < found[n]:
+                            found[n] = ds
+            best = sorted(found.items(), key=lambda item: (item[1], item[0]))[:k]
+            if len(best) == k and (r*self.size*(1-1e-9))**2 > best[-1][1]:
+                break
+        return best
+
+################################################################################
+# ring(i0, j0, r, span) -- The cells r steps out from (i0, j0), within span
+################################################################################
+
+def ring(i0, j0, r, span):
+    left, right, bottom, top = span
+    if r == 0:
+        yield (i0, j0)
+        return
+    for j in (j0-r, j0+r):
+        if bottom <= j <= top:
+            for i in range(max(i0-r, left), min(i0+r, right)+1):
+                yield (i, j)
+    for i in (i0-r, i0+r):
+        if left <= i <= right:
+            for j in range(max(j0-r+1, bottom), min(j0+r-1, top)+1):
+                yield (i, j)
+
+################################################################################
+# travel(tour, pos) -- Pen-up distance to draw `tour` starting from `pos`
+################################################################################
+
+def travel(tour, pos):
+    total = 0
+    for stroke in tour:
+        total += math.sqrt(dsq(pos, stroke[0]))
+        pos = stroke[-1]
+    return total
+
+################################################################################
+# improve(tour, pos, budget, neighbors=8) -- Shorten the pen-up travel of a tour
+#
+# Greedy tours tend to end with long jumps back across the plot.  This tries
+# 2-opt moves (turn a run of strokes around, each stroke included) and Or-opt
+# moves (pick up a run of one to three strokes and drop it somewhere else,
+# either way around), keeping any that shorten the travel.  Moves are only
+# tried against the few strokes nearest to each gap, and it stops when a whole
+# pass finds nothing or `budget` seconds have gone by.  Returns the new tour.
+################################################################################
+
+EPSILON = 1e-9
+
+def improve(tour, pos, budget, neighbors=8):
+    deadline = time.monotonic() + budget
+    tour = Tour(tour, pos, neighbors)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(tour.order)):
+            if time.monotonic() > deadline:
+                return tour.strokes()
+            if tour.two_opt(i) or tour.or_opt(i):
+                improved = True
+    return tour.strokes()
+
+################################################################################
+# Tour -- Strokes in drawing order, each possibly flipped end for end
+#
+# Position k in the tour is stroke order[k], drawn backwards if flip[] says so.
+# where[] is the position of each stroke.  Gap k is the pen-up move into
+# position k, from pos for k = 0.
+################################################################################
+
+class Tour:
+
+    def __init__(self, tour, pos, neighbors):
+        self.tour = tour
+        self.pos = pos
+        self.order = list(range(len(tour)))
+        self.where = list(range(len(tour)))
+        self.flip = bytearray(len(tour))
+        self.grid = Grid(tour)
+        self.neighbors = neighbors
+        self.near = {}
+
+    def start(self, k):
+        stroke = self.tour[self.order[k]]
+        return stroke[-1] if self.flip[self.order[k]] else stroke[0]
+
+    def end(self, k):
+        stroke = self.tour[self.order[k]]
+        return stroke[0] if self.flip[self.order[k]] else stroke[-1]
+
+    def before(self, k):
+        return self.pos if k == 0 else self.end(k-1)
+
+    def strokes(self):
+        return [self.tour[n][::-1] if self.flip[n] else self.tour[n] for n in self.order]
+
+################################################################################
+# Tour.nearby(k) -- Strokes with an end near either end of the stroke at
+# position k, or near pos for k = -1.  Found once per stroke, when first needed.
+################################################################################
+
+    def nearby(self, k):
+        n = -1 if k < 0 else self.order[k]
+        if n not in self.near:
+            points = [self.pos] if n < 0 else ends(self.tour[n])
+            found = {}
+            for point in points:
+                for m, ds in self.grid.near(point, self.neighbors+1):
+                    if m != n and (m not in found or ds < found[m]):
+                        found[m] = ds
+            self.near[n] = sorted(found, key=found.get)[:self.neighbors]
+        return self.near[n]
+
+################################################################################
+# Tour.two_opt(i) -- Close gap i onto a nearby stroke by turning a run around
+################################################################################
+
+    def two_opt(self, i):
+        last = len(self.order)-1
+        p = self.before(i)
+        s = self.start(i)
+        for m in self.nearby(i-1) + [self.order[last]]:
+            j = self.where[m]
+            if j >= i:
+                # Turn i..j around: p -> end(j), ..., start(i) -> start(j+1)
+                run = (i, j)
+                old = dist(p, s)
+                new = dist(p, self.end(j))
+                if j < last:
+                    old += dist(self.end(j), self.start(j+1))
+                    new += dist(s, self.start(j+1))
+            elif j < i-1:
+                # Turn j+1..i-1 around: end(j) -> p, ..., start(j+1) -> start(i)
+                old = dist(self.end(j), self.start(j+1)) + dist(p, s)
+                new = dist(self.end(j), p) + dist(self.start(j+1), s)
+                run = (j+1, i-1)
+            else:
+                continue
+            if new < old - EPSILON:
+                self.turn(*run)
+                return True
+        return False
+
+    def turn(self, i, j):
+        run = self.order[i:j+1][::-1]
+        self.order[i:j+1] = run
+        for k, n in enumerate(run, i):
+            self.flip[n] ^= 1
+            self.where[n] = k
+
+################################################################################
+# Tour.or_opt(i) -- Move a run of up to three strokes starting at position i
+# next to a stroke near either end of the run
+################################################################################
+
+    def or_opt(self, i):
+        n = len(self.order)
+        for length in (1, 2, 3):
+            last = i+length-1
+            if last >= n:
+                return False
+            p = self.before(i)
+            first, final = self.start(i), self.end(last)
+            after = self.start(last+1) if last+1 < n else None
+            saved = dist(p, first)
+            if after is not None:
+                saved += dist(final, after) - dist(p, after)
+            for m in self.nearby(i) + self.nearby(last):
+                for q in (self.where[m], self.where[m]-1):
+                    if i-1 <= q <= last:
+                        continue
+                    a = self.before(q+1)
+                    b = self.start(q+1) if q+1 < n else None
+                    forward = dist(a, first)
+                    backward = dist(a, final)
+                    cost = 0
+                    if b is not None:
+                        forward += dist(final, b)
+                        backward += dist(first, b)
+                        cost = dist(a, b)
+                    if min(forward, backward) - cost < saved - EPSILON:
+                        self.move(i, length, q, backward < forward)
+                        return True
+        return False
+
+    def move(self, i, length, q, turned):
+        run = self.order[i:i+length]
+        if turned:
+            run = run[::-1]
+            for n in run:
+                self.flip[n] ^= 1
+        del self.order[i:i+length]
+        q = q if q < i else q-length
+        self.order[q+1:q+1] = run
+        for k in range(min(i, q+1), max(i, q+1)+length):
+            self.where[self.order[k]] = k
+
+def dist(a, b):
+    return math.sqrt(dsq(a, b))
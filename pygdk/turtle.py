@@ -1,12 +1,338 @@
 import math
 import random
-import copy
+import functools
+import contextlib
+import itertools
+
+try:
+    import numpy
+except ImportError: # Recordings are replayed one move at a time instead
+    numpy = None
 
 RED  = '\033[31m' # Red
 CYAN   = '\033[36m'
 YELLOW = '\033[93m' # Yellow
 ENDC  = '\033[0m'  # End Color
 
+RENORMALIZE = 64 # Rotations between renormalizing the turtle's frame
+SNAP = 1e-12     # Frame components this close to 0 or 1 snap to the axis
+RECORDING = 4096 # Recorded moves to hold before handing them to the machine
+EXPANSION = 4096 # Longest L-system expansion kept whole for reuse
+
+################################################################################
+# Rotations -- Cached matrices for turning the turtle's frame
+#
+# Turtle programs turn by the same few angles about the same few axes over and
+# over, so each (axis, angle) matrix is only built once.  Quarter turns use
+# exact sines and cosines, so a turtle that only ever turns by multiples of 90
+# degrees stays exactly on the axes.  Angles are in degrees.
+################################################################################
+
+@functools.lru_cache(maxsize=4096)
+def rotation(n, angle):
+    cos, sin = sincos(angle)
+    return ( (cos+(n[0]**2)*(1-cos),         n[0]*n[1]*(1-cos)-n[2]*sin,     n[0]*n[2]*(1-cos)+n[1]*sin),
+             (n[0]*n[1]*(1-cos)+n[2]*sin,    cos+(n[1]**2)*(1-cos),          n[1]*n[2]*(1-cos)-n[0]*sin),
+             (n[0]*n[2]*(1-cos)-n[1]*sin,    n[1]*n[2]*(1-cos)+n[0]*sin,     cos+(n[2]**2)*(1- cos)) )
+
+def sincos(angle):
+    quarter, rest = divmod(angle, 90)
+    if rest == 0:
+        return ((1.0, 0.0), (0.0, 1.0), (-1.0, 0.0), (0.0, -1.0))[int(quarter) % 4]
+    angle = math.radians(angle)
+    return math.cos(angle), math.sin(angle)
+
+def rotate(v, m):
+    (a, b, c), (d, e, f), (g, h, i) = m
+    x, y, z = v
+    x, y, z = x*a + y*d + z*g, x*b + y*e + z*h, x*c + y*f + z*i
+    return [x if SNAP < abs(x) < 1-SNAP else snap(x),
+            y if SNAP < abs(y) < 1-SNAP else snap(y),
+            z if SNAP < abs(z) < 1-SNAP else snap(z)]
+
+def snap(w):
+    return 0 if -SNAP < w < SNAP else 1 if -SNAP < w-1 < SNAP else -1.0 if -SNAP < w+1 < SNAP else w
+
+def snapped(v):
+    return [snap(w) for w in v]
+
+################################################################################
+# Planar Headings -- (heading, right) for a level turtle headed `angle` degrees
+# counterclockwise from +X
+#
+# ANGLES maps each heading handed out back to its angle, so a heading saved
+# and restored (L-system brackets) picks up exactly where it left off.
+################################################################################
+
+ANGLES = {}
+
+@functools.lru_cache(maxsize=4096)
+def planar(angle):
+    cos, sin = sincos(angle)
+    heading = snapped([cos, sin, 0])
+    if len(ANGLES) < 4096:
+        ANGLES[heading[0], heading[1]] = angle
+    return tuple(heading), tuple(snapped([sin, -cos, 0]))
+
+def turned(angle, bend):
+    angle -= bend
+    if not -180 < angle <= 180: # Near 0 floats are finer than near 360
+        angle = 180 - (180 - angle) % 360
+    return angle
+
+################################################################################
+# chords(radius, extent, tolerance) -- Steps for circle() to keep each chord
+# within `tolerance` of the arc it cuts across
+################################################################################
+
+def chords(radius, extent, tolerance):
+    radius = abs(radius)
+    if tolerance <= 0:
+        raise ValueError(f"{RED}Circle tolerance must be positive, not {tolerance}{ENDC}")
+    if tolerance >= radius:
+        return max(1, math.ceil(abs(extent)/180))
+    return max(1, math.ceil(abs(math.radians(extent)) / (2*math.acos(1 - tolerance/radius))))
+
+################################################################################
+# arc_length(x0, y0, x, y, i, j, clockwise) -- How far a G2/G3 from (x0, y0) to
+# (x, y), around the center offset (i, j), travels
+#
+# An arc that ends where it starts is a full circle, as it is to the machine.
+################################################################################
+
+def arc_length(x0, y0, x, y, i, j, clockwise):
+    sweep = math.atan2(y-y0-j, x-x0-i) - math.atan2(-j, -i)
+    sweep = (-sweep if clockwise else sweep) % (2*math.pi)
+    if math.isclose(sweep, 0, abs_tol=SNAP) or math.isclose(sweep, 2*math.pi, abs_tol=SNAP):
+        sweep = 2*math.pi
+    return sweep*math.hypot(i, j)
+
+################################################################################
+# expand(axiom, rules, n) -- Generator of L-system turtle commands, in chunks
+#
+# Walks the rewrite tree depth-first instead of building each generation's
+# string, so memory goes with n rather than with the length of the result.
+# Only the characters the turtle acts on come out; everything else is just
+# scaffolding for the rewrites.
+#
+# Symbols whose rules never lead to a stochastic rule expand the same way every
+# time, so their expansions are kept (up to EXPANSION characters) and reused.
+# Stochastic rules (a list to pick from, or a dict of weights) are still picked
+# once per rule per generation, but only once the walk gets to that generation,
+# in the same order as rewriting one generation at a time would pick them.
+################################################################################
+
+COMMANDS = frozenset('FGf@+-[]')
+
+def expand(axiom, rules, n):
+    stochastic = [rule for rule in rules if not isinstance(rules[rule], str)]
+    varies = set(stochastic)
+    while True:
+        more = {rule for rule in rules if rule not in varies and any(c in varies for c in rules[rule])}
+        if not more:
+            break
+        varies |= more
+    picks = [] # One {rule: pick} per generation, as they're reached
+    expansions = {}
+
+    def pick(rule, generation):
+        while len(picks) <= generation:
+            chosen = {}
+            for stochastic_rule in stochastic:
+                options = rules[stochastic_rule]
+                if isinstance(options, list):
+                    chosen[stochastic_rule] = random.choice(options)
+                else:
+                    chosen[stochastic_rule] = random.choices(list(options), list(options.values()), k=1)[0]
+            picks.append(chosen)
+        return picks[generation][rule]
+
+    @functools.lru_cache(maxsize=None)
+    def length(symbol, depth):
+        if depth == 0 or symbol not in rules:
+            return 1 if symbol in COMMANDS else 0
+        return sum(length(c, depth-1) for c in rules[symbol])
+
+    def walk(symbol, depth):
+        if depth == 0 or symbol not in rules:
+            if symbol in COMMANDS:
+                yield symbol
+            return
+        if symbol in varies:
+            body = rules[symbol] if isinstance(rules[symbol], str) else pick(symbol, n-depth)
+            for c in body:
+                yield from walk(c, depth-1)
+            return
+        key = (symbol, depth)
+        if key in expansions:
+            yield expansions[key]
+        elif length(symbol, depth) <= EXPANSION:
+            expansions[key] = ''.join(itertools.chain.from_iterable(walk(c, depth-1) for c in rules[symbol]))
+            yield expansions[key]
+        else:
+            for c in rules[symbol]:
+                yield from walk(c, depth-1)
+
+    for symbol in axiom:
+        yield from walk(symbol, n)
+
+################################################################################
+# Instancing -- Drawing the same L-system chunk again
+#
+# Once a memoized chunk has been drawn while recording, the next time it comes
+# up (with the same segment length and pen) the recording it made is played
+# again from wherever the turtle is, instead of running the turtle through it.
+# That only works for chunks that don't need the turtle's position (brackets),
+# don't change the segment length (@), and don't lift or drop the pen.
+################################################################################
+
+def moves(chunk):
+    return chunk.count('F') + chunk.count('G') + chunk.count('f')
+
+def instanceable(chunk, isdown, lift):
+    if '[' in chunk or ']' in chunk or '@' in chunk:
+        return False
+    if isdown:
+        return not (lift and 'f' in chunk)
+    return 'F' not in chunk and 'G' not in chunk
+
+################################################################################
+# raster(depths) -- Cuts for a heightmap, as (x, y, z) arrays in pixels
+#
+# `depths` is a 2D array of z values with row 0 at y=0.  Rows are cut back and
+# forth.  Pixels at zero depth aren't cut at all, so every stretch between them
+# becomes its own cut and the tool rapids over the gaps.  Within a cut, pixels
+# that sit on a straight line (in x and z) between their neighbors in the same
+# row are dropped, so flat or evenly sloped stretches are a single move.
+################################################################################
+
+STRAIGHT = 1e-9 # z (mm) a dropped pixel may be off the line between its neighbors
+
+def raster(depths):
+    height, width = depths.shape
+    depths = numpy.array(depths, dtype=float)
+    columns = numpy.tile(numpy.arange(width), (height, 1))
+    depths[1::2] = depths[1::2, ::-1] # Every other row runs right to left
+    columns[1::2] = columns[1::2, ::-1]
+    depths, columns = depths.ravel(), columns.ravel()
+    rows = numpy.repeat(numpy.arange(height), width)
+    cut = depths != 0
+    keep = cut.copy()
+    straight = (numpy.abs(depths[2:] - 2*depths[1:-1] + depths[:-2]) <= STRAIGHT) & (rows[2:] == rows[:-2])
+    keep[1:-1] &= ~(straight & cut[:-2] & cut[2:])
+    edges = numpy.diff(numpy.concatenate(([False], cut, [False])).astype(numpy.int8))
+    starts = numpy.flatnonzero(edges == 1)
+    if not len(starts):
+        return []
+    kept = numpy.flatnonzero(keep)
+    runs = []
+    for points in numpy.split(kept, numpy.searchsorted(kept, starts[1:])):
+        runs.append((columns[points], rows[points], depths[points]))
+    return runs
+
+################################################################################
+# dilate(depths, footprint) -- The lowest the tool tip can go over each pixel
+#
+# A grey-scale dilation of the surface by the tool's footprint (see
+# Tool.footprint): over each pixel, the tip has to stay high enough that no
+# part of the tool dips below the surface anywhere under it.  Past the edges of
+# the image there's nothing to hit.
+################################################################################
+
+SHAPES = ('cylindrical', 'ballnose', 'conical') # Tools dilate() can compensate for
+
+def dilate(depths, footprint):
+    height, width = depths.shape
+    n = max(max(abs(dy), abs(dx)) for dy, dx, lift in footprint)
+    padded = numpy.full((height+2*n, width+2*n), -numpy.inf)
+    padded[n:n+height, n:n+width] = depths
+    tip = numpy.full((height, width), -numpy.inf)
+    for dy, dx, lift in footprint:
+        numpy.maximum(tip, padded[n+dy:n+dy+height, n+dx:n+dx+width] - lift, out=tip)
+    return tip
+
+def snapped_array(v):
+    v[numpy.abs(v) < SNAP] = 0
+    v[numpy.abs(v-1) < SNAP] = 1
+    v[numpy.abs(v+1) < SNAP] = -1
+    return v
+
+def dot(a, b):
+    return a[0]*b[0] + a[1]*b[1] + a[2]*b[2]
+
+def cross(a, b):
+    v = [a[1]*b[2]-a[2]*b[1], a[2]*b[0]-a[0]*b[2], a[0]*b[1]-a[1]*b[0]]
+    return v if dot(v, v) > SNAP else None
+
+def normalized(v):
+    length = math.sqrt(dot(v, v))
+    return [i/length for i in v]
+
+################################################################################
+# Vec3 / Frame -- The turtle's heading, normal, and right vectors
+#
+# Turning changes these thousands of times a second, so they're updated in
+# place rather than rebuilt as new lists.  A Vec3 still reads like a list of
+# three numbers (indexing, iterating, comparing equal to [x, y, z]).
+# Frame.snapshot() packs the whole frame into one tuple for saving and
+# restore() puts it back, which is all an L-system bracket needs.
+################################################################################
+
+class Vec3:
+    __slots__ = ('x', 'y', 'z')
+
+    def __init__(self, x=0, y=0, z=0):
+        self.x = x
+        self.y = y
+        self.z = z
+
+    def set(self, x, y, z):
+        self.x = x
+        self.y = y
+        self.z = z
+
+    def rotate(self, m):
+        (a, b, c), (d, e, f), (g, h, i) = m
+        x, y, z = self.x, self.y, self.z
+        x, y, z = x*a + y*d + z*g, x*b + y*e + z*h, x*c + y*f + z*i
+        self.x = x if SNAP < abs(x) < 1-SNAP else snap(x)
+        self.y = y if SNAP < abs(y) < 1-SNAP else snap(y)
+        self.z = z if SNAP < abs(z) < 1-SNAP else snap(z)
+
+    def __getitem__(self, n):
+        return (self.x, self.y, self.z)[n]
+
+    def __iter__(self):
+        return iter((self.x, self.y, self.z))
+
+    def __len__(self):
+        return 3
+
+    def __eq__(self, other):
+        return len(other) == 3 and (self.x, self.y, self.z) == tuple(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr([self.x, self.y, self.z])
+
+class Frame:
+    __slots__ = ('heading', 'normal', 'right')
+
+    def __init__(self):
+        self.heading = Vec3(1,0,0)
+        self.normal = Vec3(0,0,1)
+        self.right = Vec3(0,-1,0)
+
+    def snapshot(self):
+        h, n, r = self.heading, self.normal, self.right
+        return (h.x, h.y, h.z, n.x, n.y, n.z, r.x, r.y, r.z)
+
+    def restore(self, snapshot):
+        self.heading.set(*snapshot[0:3])
+        self.normal.set(*snapshot[3:6])
+        self.right.set(*snapshot[6:9])
+
 class Turtle:
 
 ################################################################################
@@ -19,13 +345,23 @@ class Turtle:
         self._machine = machine
         self._isdown = False
         self._mode = mode
-        self.heading = [1,0,0]
-        self.normal = [0,0,1]
-        self.right_v = [0,-1,0]
+        self._frame = Frame()
+        self._heading = self._frame.heading
+        self._normal = self._frame.normal
+        self._right = self._frame.right
+        self._turns = 0 # Rotations since the frame was last renormalized
+        self._angle = 0 # Heading in degrees while level in the XY-plane, else None
+        self._recording = False
+        self._bends = []     # Recorded turns
+        self._distances = [] # Recorded forward moves
+        self._marks = []     # ... how many turns came before each one
+        self._comments = []  # ... and their comments
         self._x = x
         self._y = y
         self._z = z
         self._z_draw = z_draw
+        self.tolerance = None # Chord error (mm) that sets circle() steps when not given
+        self.arcs = False     # Draw level circles as G2/G3 arcs instead of chords
         if verbose: machine.queue(comment=f"Turtle | [x,y,z]: {[x,y,z]}", style='turtle')
 #        machine.retract()
 
@@ -41,17 +377,22 @@ class Turtle:
 ################################################################################
 
     def forward(self, distance, dz=0, e=None, comment=None):
-        x = self._x + distance * self.heading[0]
-        y = self._y + distance * self.heading[1]
+        if self._recording and self._angle is not None and not dz and e is None:
+            self.record(distance, comment)
+            return
+        self.replay()
+        heading = self._heading
+        x = self._x + distance * heading.x
+        y = self._y + distance * heading.y
         if dz: # 2.5D motion
-            if self.heading[2] == 0:
+            if heading.z == 0:
                 z = self._z + dz
             else:
                 raise ValueError(f"{RED}You can only use 2.5D motion in the XY-plane")
         else: # 3D motion
-            z = self._z + distance * self.heading[2]
+            z = self._z + distance * heading.z
         if self._verbose and comment is None:
-            comment = f"Moving at {[round(i,4) for i in self.heading]} from ({self._x:.4f}, {self._y:.4f}, {self._z:.4f}) to ({x:.4f}, {y:.4f}, {z:.4f})"
+            comment = f"Moving at {[round(i,4) for i in self._heading]} from ({self._x:.4f}, {self._y:.4f}, {self._z:.4f}) to ({x:.4f}, {y:.4f}, {z:.4f})"
         self.goto(x, y, z, e, comment=comment)
 
     fd = forward
@@ -72,57 +413,126 @@ class Turtle:
     bk = back
 
 ################################################################################
-# Rotation Matrix -- Heavy Math Helpers for Roll, Pitch, and Yaw
+# Orientation -- An orthonormal frame of heading, normal, and right vectors
+#
+# Setting the heading or normal directly re-derives the right vector, so the
+# frame stays consistent for later rolls and pitches.
+#
+# Almost every turtle stays level in the XY-plane (normal +Z).  While it does,
+# the heading is also kept as a plain angle, and yaw just adds to the angle and
+# looks up the cached heading (see planar()).  A roll or pitch that tips the
+# turtle out of the plane switches over to full 3D rotations.
+################################################################################
+
+    @property
+    def heading(self):
+        self.replay()
+        return list(self._heading)
+
+    @heading.setter
+    def heading(self, value):
+        self.replay()
+        self._heading.set(*value)
+        self.rederive()
+        self.level()
+
+    @property
+    def normal(self):
+        self.replay()
+        return list(self._normal)
+
+    @normal.setter
+    def normal(self, value):
+        self.replay()
+        self._normal.set(*value)
+        self.rederive()
+        self.level()
+
+    def rederive(self):
+        right = cross(self._heading, self._normal)
+        if right is not None:
+            self._right.set(*right)
+
+    def level(self):
+        x, y, z = self._heading
+        n = self._normal
+        if n.x == 0 and n.y == 0 and n.z == 1 and z == 0 and abs(x*x+y*y-1) < SNAP:
+            angle = ANGLES.get((x, y))
+            self._angle = math.degrees(math.atan2(y, x)) if angle is None else angle
+        else:
+            self._angle = None
+
+    @property
+    def right_v(self):
+        self.replay()
+        return list(self._right)
+
+    @right_v.setter
+    def right_v(self, value):
+        self.replay()
+        self._right.set(*value)
+
+################################################################################
+# Rotation Helpers for Roll, Pitch, and Yaw
+#
+# Every turn counts towards renormalizing the frame, which takes out the drift
+# that builds up over thousands of rotations.
 ################################################################################
 
     def rot(self, n, angle):
-        cos = math.cos(angle)
-        sin = math.sin(angle)
-        return [ [cos+(n[0]**2)*(1-cos),         n[0]*n[1]*(1-cos)-n[2]*sin,     n[0]*n[2]*(1-cos)+n[1]*sin],
-                 [n[0]*n[1]*(1-cos)+n[2]*sin,    cos+(n[1]**2)*(1-cos),          n[1]*n[2]*(1-cos)-n[0]*sin],
-                 [n[0]*n[2]*(1-cos)-n[1]*sin,    n[1]*n[2]*(1-cos)+n[0]*sin,     cos+(n[2]**2)*(1- cos)] ]
+        return rotation(tuple(n), math.degrees(angle))
         # http://scipp.ucsc.edu/~haber/ph216/rotation_12.pdf
 
     def dot(self, m1, m2):
-        # https://stackoverflow.com/questions/10508021/matrix-multiplication-in-pure-python
-        dp = [[sum(x*y for x,y in zip(m1_r, m2_c)) for m2_c in zip(*m2)] for m1_r in m1]
-
-        # I hate this, but w/o it, cumulative error gets crazy after a few hundred rotations
-        # It basically "snaps" to an axis if you're within 0.000000000001 of it
-        if round(dp[0][0],12) == 0: dp[0][0] = 0
-        if round(dp[0][0],12) == 1: dp[0][0] = 1
-        if round(dp[0][1],12) == 0: dp[0][1] = 0
-        if round(dp[0][1],12) == 1: dp[0][1] = 1
-        if round(dp[0][2],12) == 0: dp[0][2] = 0
-        if round(dp[0][2],12) == 1: dp[0][2] = 1
-
-        return dp
+        return [rotate(row, m2) for row in m1]
 
     def mag(self, vector):
         return sum(i*i for i in vector)
 
+    def turn(self):
+        self._turns += 1
+        if self._turns >= RENORMALIZE:
+            self.renormalize()
+
+    def renormalize(self):
+        self._turns = 0
+        heading = normalized(self._heading)
+        d = dot(self._normal, heading)
+        normal = [n-d*h for n, h in zip(self._normal, heading)]
+        if self.mag(normal) < SNAP: # Heading was set along the normal
+            return
+        self._heading.set(*snapped(heading))
+        self._normal.set(*snapped(normalized(normal)))
+        self._right.set(*snapped(cross(self._heading, self._normal)))
+
 ################################################################################
 # Turtle.roll - Roll side to side without changing the heading vector
 ################################################################################
 
     def roll(self, angle):
-        angle = math.radians(angle)
-        self.right_v = self.dot([self.right_v], self.rot(self.heading, angle))[0]
-        self.normal = self.dot([self.normal], self.rot(self.heading, angle))[0]
+        self.replay()
+        h = self._heading
+        m = rotation((h.x, h.y, h.z), angle)
+        self._right.rotate(m)
+        self._normal.rotate(m)
+        self.turn()
+        self.level()
 
 ################################################################################
 # Turtle.pitch - Tilt up or down without changing the side vector
 ################################################################################
 
     def pitch(self, angle):
-        angle = -math.radians(angle)
-        self.heading = self.dot([self.heading], self.rot(self.right_v, angle))[0]
-        self.normal = self.dot([self.normal], self.rot(self.right_v, angle))[0]
+        self.replay()
+        r = self._right
+        m = rotation((r.x, r.y, r.z), -angle)
+        self._heading.rotate(m)
+        self._normal.rotate(m)
+        self.turn()
+        self.level()
 
     def pitchrr(self, rise, run):
-        angle = -math.atan2(rise, run)
-        self.heading = self.dot([self.heading], self.rot(self.right_v, angle))[0]
-        self.normal = self.dot([self.normal], self.rot(self.right_v, angle))[0]
+        self.pitch(math.degrees(math.atan2(rise, run)))
 
 ################################################################################
 # Turtle.yaw - Rotate right or left as viewed from above without changing the
@@ -130,9 +540,17 @@ class Turtle:
 ################################################################################
 
     def yaw(self, angle):
-        angle = math.radians(angle)
-        self.heading = self.dot([self.heading], self.rot(self.normal, angle))[0]
-        self.right_v = self.dot([self.right_v], self.rot(self.normal, angle))[0]
+        if self._angle is not None:
+            if self._recording:
+                self._bends.append(angle)
+            else:
+                self.steer(turned(self._angle, angle))
+            return
+        n = self._normal
+        m = rotation((n.x, n.y, n.z), angle)
+        self._heading.rotate(m)
+        self._right.rotate(m)
+        self.turn()
 
     right = yaw
     rt = yaw
@@ -142,6 +560,108 @@ class Turtle:
 
     lt = left
 
+    def steer(self, angle):
+        self._angle = angle
+        heading, right = planar(angle)
+        self._heading.set(*heading)
+        self._right.set(*right)
+
+################################################################################
+# Turtle.recording() -- Record moves and turns, then queue them all at once
+#
+#   with turtle.recording():
+#       for i in range(10000):
+#           turtle.forward(1)
+#           turtle.left(7)
+#
+# While level in the XY-plane, forward() and turns are only written down.  The
+# turtle works out where they went (headings are a running sum of the turns,
+# positions a running sum of the steps) and hands the machine the whole block
+# of moves when the recording ends, or as soon as anything needs to know where
+# the turtle is -- position(), goto(), a pen change, a roll, or anything else
+# being queued on the machine.  The G-code is the same as without recording.
+################################################################################
+
+    @contextlib.contextmanager
+    def recording(self):
+        recording, self._recording = self._recording, True
+        try:
+            yield self
+        finally:
+            self._recording = recording
+            if not recording:
+                self.replay()
+
+    def record(self, distance, comment):
+        if len(self._distances) >= RECORDING:
+            self.replay()
+        if not self._distances:
+            self._machine.replay() # Another turtle's recording goes first
+            self._machine._recording = self
+        self._distances.append(distance)
+        self._marks.append(len(self._bends))
+        self._comments.append(comment)
+
+################################################################################
+# Turtle.recorded(distances, bends) -- What was recorded since those lengths
+# Turtle.play(recorded) -- Record it all over again from wherever we are now
+#
+# Recorded turns are relative, so the same piece of recording draws the same
+# shape turned and moved to wherever the turtle happens to be.  Only use this
+# for stretches that were recorded without being replayed part way through.
+################################################################################
+
+    def recorded(self, distances, bends):
+        return self._distances[distances:], [mark-bends for mark in self._marks[distances:]], self._bends[bends:]
+
+    def play(self, recorded):
+        distances, marks, bends = recorded
+        if distances:
+            if len(self._distances) + len(distances) > RECORDING:
+                self.replay()
+            if not self._distances:
+                self._machine.replay() # Another turtle's recording goes first
+                self._machine._recording = self
+            offset = len(self._bends)
+            self._marks.extend([mark+offset for mark in marks])
+            self._distances.extend(distances)
+            self._comments.extend([None]*len(distances))
+        self._bends.extend(bends)
+
+    def replay(self):
+        if not self._bends and not self._distances:
+            return
+        self._machine._recording = None
+        distances, marks, comments, bends = self._distances, self._marks, self._comments, self._bends
+        self._distances, self._marks, self._comments, self._bends = [], [], [], []
+        angles = list(itertools.accumulate(bends, turned, initial=self._angle))
+        if not distances:
+            self.steer(angles[-1])
+            return
+        if numpy is None:
+            recording, self._recording = self._recording, False
+            for distance, mark, comment in zip(distances, marks, comments):
+                self.steer(angles[mark])
+                self.forward(distance, comment=comment)
+            self.steer(angles[-1])
+            self._recording = recording
+            return
+        radians = numpy.radians(numpy.array(angles)[marks])
+        cos = snapped_array(numpy.cos(radians))
+        sin = snapped_array(numpy.sin(radians))
+        distances = numpy.array(distances, dtype=float)
+        x = numpy.cumsum(numpy.concatenate(([self._x], distances*cos))).tolist()
+        y = numpy.cumsum(numpy.concatenate(([self._y], distances*sin))).tolist()
+        z = [self._z]*len(y)
+        if self._verbose:
+            comments = [f"Moving at {[round(i,4) for i in snapped([c, s, 0])]} from ({x[n]:.4f}, {y[n]:.4f}, {z[n]:.4f}) to ({x[n+1]:.4f}, {y[n+1]:.4f}, {z[n+1]:.4f})" if comment is None else comment
+                        for n, (c, s, comment) in enumerate(zip(cos.tolist(), sin.tolist(), comments))]
+        elif all(comment is None for comment in comments):
+            comments = None
+        self._machine.moves(x[1:], y[1:], z[1:], li=self._isdown, comments=comments)
+        self._x, self._y = x[-1], y[-1]
+        self.steer(angles[-1])
+
 ################################################################################
 # Turtle.goto(x, y=None)
 # Turtle.setpos(x, y=None)
@@ -155,6 +675,7 @@ class Turtle:
 ################################################################################
 
     def goto(self, x=None, y=None, z=None, e=None, comment=None):
+        self.replay()
         if x is not None:
             self._x = x
         if y is not None:
@@ -173,6 +694,7 @@ class Turtle:
 ################################################################################
 
     def delta(self, x=None, y=None, z=None, e=None, comment=None):
+        self.replay()
         if x is not None:
             self._x = self._x + x
         if y is not None:
@@ -190,6 +712,7 @@ class Turtle:
 ################################################################################
 
     def setx(self, x):
+        self.replay()
         self.goto(x, self._y)
 
 ################################################################################
@@ -200,6 +723,7 @@ class Turtle:
 ################################################################################
 
     def sety(self, y):
+        self.replay()
         self.goto(self._x, y)
 
 ################################################################################
@@ -234,11 +758,29 @@ class Turtle:
 # As the circle is approximated by an inscribed regular polygon, steps
 # determines the number of steps to use. If not given, it will be calculated
 # automatically. May be used to draw regular polygons.
+#
+# Without steps, `tolerance` (or Turtle.tolerance) picks just enough steps to
+# keep every chord within that distance of the true circle, so a 0.5 mm
+# turnaround and a 110 mm skirt both come out right.  With neither, you get
+# 10 steps.
+#
+# With `arc` (or Turtle.arcs) and the turtle level in the XY-plane, the circle
+# is one G2/G3 arc (one per full turn) instead of chords.  Radius 0 just turns
+# in place.
 ################################################################################
 
-    def circle(self, radius, extent=360, steps=10, comment=None):
+    def circle(self, radius, extent=360, steps=None, comment=None, tolerance=None, arc=None):
+        tolerance = self.tolerance if tolerance is None else tolerance
+        arc = self.arcs if arc is None else arc
+        if arc and steps is None and self._angle is not None and not self._machine._optimize:
+            pieces = max(1, math.ceil(abs(extent)/360))
+            for _ in range(pieces):
+                self.arc(radius, extent/pieces, comment)
+            return
+        if steps is None:
+            steps = chords(radius, extent, tolerance) if tolerance else 10
         side = abs(2*radius*math.sin(math.pi*extent/360/steps))
-        angle = extent/steps if radius > 0 else -extent/steps
+        angle = extent/steps if radius >= 0 else -extent/steps
         self.left(angle/2)
         self.forward(side, comment=comment)
         for i in range(steps-1):
@@ -246,6 +788,31 @@ class Turtle:
             self.forward(side, comment=comment)
         self.left(angle/2)
 
+    def arc(self, radius, extent, comment=None):
+        self.replay()
+        if radius:
+            # Same path as the chords: counterclockwise, around a center on
+            # the left, when radius and extent have the same sign
+            x, y = self._x, self._y
+            counterclockwise = (radius > 0) == (extent > 0)
+            offset = abs(radius) if counterclockwise else -abs(radius)
+            c_x, c_y = x - offset*self._heading.y, y + offset*self._heading.x
+            cos, sin = sincos(abs(extent) if counterclockwise else -abs(extent))
+            end_x = c_x + (x-c_x)*cos - (y-c_y)*sin
+            end_y = c_y + (x-c_x)*sin + (y-c_y)*cos
+            if self._verbose and comment is None:
+                comment = f"Arc of {extent} degrees around ({c_x:.4f}, {c_y:.4f}) from ({x:.4f}, {y:.4f}) to ({end_x:.4f}, {end_y:.4f})"
+            self.arc_to(end_x, end_y, c_x-x, c_y-y, not counterclockwise, comment=comment)
+        if radius >= 0:
+            self.left(extent)
+        else:
+            self.right(extent)
+
+    def arc_to(self, x, y, i, j, clockwise, e=None, comment=None):
+        self._x = x
+        self._y = y
+        self._machine.arc(x, y, i, j, clockwise, self._z, e, li=self._isdown, comment=comment)
+
 ################################################################################
 # Turtle.speed(speed=None)
 #
@@ -267,6 +834,7 @@ class Turtle:
 ################################################################################
 
     def position(self):
+        self.replay()
         return [self._x, self._y, self._z]
 
     pos = position
@@ -289,6 +857,7 @@ class Turtle:
 ################################################################################
 
     def xcor(self):
+        self.replay()
         return self._x
 
 ################################################################################
@@ -298,6 +867,7 @@ class Turtle:
 ################################################################################
 
     def ycor(self):
+        self.replay()
         return self._y
 
 ################################################################################
@@ -307,6 +877,7 @@ class Turtle:
 ################################################################################
 
     def distance(self, x, y=None):
+        self.replay()
         if y is None:
             y = x[1]
             x = x[0]
@@ -321,6 +892,7 @@ class Turtle:
 ################################################################################
 
     def pendown(self, z=None):
+        self.replay()
         self._isdown = True
         if z is not None:
             self._z_draw = z
@@ -339,6 +911,7 @@ class Turtle:
 ################################################################################
 
     def penup(self):
+        self.replay()
         self._isdown = False
         self._machine.retract(comment="Penup" if self._verbose else None)
         self._z = self._machine.safe_z
@@ -366,6 +939,7 @@ class Turtle:
 ################################################################################
 
     def pencolor(self, color=None, next=None):
+        self.replay()
         if color is not None:
             self._machine.pen_color = color
             self._pencolor = color
@@ -440,24 +1014,24 @@ class Turtle:
         if None in [axiom, rules, angle, n]:
             raise ValueError(f"{RED}L-systems must have axiom, rules, angle, and n defined.{ENDC}")
 
-        seq = axiom
-        for _ in range(n):
-            _rules = copy.deepcopy(rules)
-            for rule in _rules:
-                if isinstance(_rules[rule], list):
-                    _rules[rule] = random.choice(_rules[rule])
-                elif isinstance(_rules[rule], dict):
-                    options = []
-                    weights = []
-                    for option in _rules[rule]:
-                        options.append(option)
-                        weights.append(_rules[rule][option])
-                    _rules[rule] = random.choices(options, weights, k=1)[0]
-            seq = ''.join([_rules.get(c,c) for c in seq])
-
-#        print(seq)
-        stack = []
-        for command in seq:
+        instances = {} # (chunk, seg, pen down) -> what drawing it recorded
+        with self.recording():
+            stack = []
+            for chunk in expand(axiom, rules, n):
+                key = (chunk, seg, self._isdown)
+                if key in instances and self._angle is not None:
+                    self.play(instances[key])
+                    continue
+                distances, bends = len(self._distances), len(self._bends)
+                seg = self.interpret(chunk, seg, angle, lift, stack)
+                if len(chunk) > 1 and instanceable(chunk, key[2], lift) and self._isdown == key[2] \
+                        and len(self._distances) - distances == moves(chunk) \
+                        and len(self._bends) - bends == chunk.count('+') + chunk.count('-'):
+                    instances[key] = self.recorded(distances, bends)
+        self._machine.safe_z = safe_z
+
+    def interpret(self, chunk, seg, angle, lift, stack):
+        for command in chunk:
             if command in ['F','G']:
                 if not self._isdown:
                     self.pendown()
@@ -473,15 +1047,18 @@ class Turtle:
             elif command == '-':
                 self.left(angle)
             elif command == '[':
-                stack.append((self.position(), self.orientation, seg))
+                self.replay()
+                stack.append((self._x, self._y, self._z, self._frame.snapshot(), self._angle, seg))
             elif command == ']':
-                position, orientation, seg = stack.pop()
-                if position != self.position():
+                x, y, z, frame, heading, seg = stack.pop()
+                self.replay()
+                if x != self._x or y != self._y or z != self._z:
                     if self._isdown and lift:
                         self.penup()
-                    self.goto(position[0], position[1])
-                self.orientation = orientation
-        self._machine.safe_z = safe_z
+                    self.goto(x, y)
+                self._frame.restore(frame)
+                self._angle = heading
+        return seg
 
 ################################################################################
 # Bethlehem Star
@@ -518,10 +1095,22 @@ class Turtle:
 
 ################################################################################
 # Heightmaps
+#
+# Carve a grey-scale image: black is the top of the stock, white is z_bottom
+# (or the other way around with `invert`), `res` pixels per mm.
+#
+# With a cylindrical, ballnose, or conical tool (`tool`, or else the machine's
+# current tool), the tool tip follows the surface dilated by the tool's shape,
+# so no part of the tool cuts below the image.  Roughing passes `stepover` mm
+# apart take the stock down `z_step` at a time to `allowance` above that, then
+# a finishing pass `finish` mm apart cuts the rest.  Without a tool (or with
+# tool=False), the tip just follows the pixels.
 ################################################################################
 
-    def heightmap(self, filename, z_bottom=-10, x=None, y=None, invert=False, res=1):
+    def heightmap(self, filename, z_bottom=-10, x=None, y=None, invert=False, res=1, tool=None, stepover=None, z_step=None, allowance=0.25, finish=None):
         from PIL import Image, ImageOps
+        if numpy is None:
+            raise ImportError(f"{RED}Heightmaps need the `numpy` package.  Try `pip install numpy`{ENDC}")
         im = Image.open(filename).convert("L")
         width, height = im.size
         if x is not None:
@@ -529,21 +1118,43 @@ class Turtle:
             width, height = im.size
         if invert:
             im = ImageOps.invert(im)
-        pixels = im.load()
-        self.pendown()
-        odd = False
-        first = True
-        for y in range(height):
-            odd = not odd
-            for x in range(width):
-                _x = x if odd else width-x-1
-                _z = pixels[_x,height-y-1]/255*z_bottom
-                if _z != 0:
-                    if first:
-                        self.goto(_x/res,y/res)
-                        first = False
-                    self.goto(_x/res,y/res,_z)
+        depths = numpy.asarray(im)[::-1]/255*z_bottom
+        if tool is not None and tool is not False and getattr(tool, 'shape', None) not in SHAPES:
+            raise ValueError(f"{RED}Heightmaps can only compensate for {SHAPES} tools{ENDC}")
+        if tool is None:
+            tool = self._machine.tool
+        if getattr(tool, 'shape', None) not in SHAPES:
+            if self._verbose:
+                self._machine.queue(comment=f"Heightmap | {filename}: {width}x{height} pixels", style='turtle')
+            self.carve(depths, res)
+            return
+        tip = dilate(depths, tool.footprint(res))
+        stepover = 0.4*tool.diameter if stepover is None else stepover
+        z_step = tool.radius if z_step is None else z_step
+        finish = 0.1*tool.diameter if finish is None else finish
+        if self._verbose:
+            self._machine.queue(comment=f"Heightmap | {filename}: {width}x{height} pixels, compensated for {tool.diameter:.4f} mm {tool.shape} tool", style='turtle')
+        if stepover:
+            rough = numpy.minimum(tip + allowance, 0)
+            level = 0
+            while level > rough.min():
+                depths = numpy.where(rough < level, numpy.maximum(rough, level - z_step), 0)
+                level -= z_step
+                if self._verbose:
+                    self._machine.queue(comment=f"Heightmap | Roughing to {max(level, rough.min()):.4f} mm, {stepover:.4f} mm stepover", style='turtle')
+                self.carve(depths, res, max(1, round(stepover*res)))
+        if self._verbose:
+            self._machine.queue(comment=f"Heightmap | Finishing, {finish:.4f} mm stepover", style='turtle')
+        self.carve(tip, res, max(1, round(finish*res)))
+
+    def carve(self, depths, res, step=1):
         self.penup()
+        for xs, ys, zs in raster(depths[::step]):
+            xs, ys, zs = (xs/res).tolist(), (ys*step/res).tolist(), zs.tolist()
+            self._machine.retract(xs[0], ys[0], comment="Rapid to next cut" if self._verbose else None)
+            self._machine.moves(xs, ys, zs, li=True)
+            self._machine.retract(comment="Penup" if self._verbose else None)
+            self._x, self._y, self._z = xs[-1], ys[-1], zs[-1]
 
 ################################################################################
 # Geometric Primitives
@@ -810,25 +1421,108 @@ class Turtle:
         self._machine.y_offset -= start[1]
         return(1*scale)
 
-    def write(self, text=None, start=[0,0], height=10):
+    def write(self, text=None, start=None, height=10):
         scale = height/10
-        dispatcher = {
-            'm': self.draw_m,
-            '1': self.draw_1,
-            '2': self.draw_2,
-            '3': self.draw_3,
-            '4': self.draw_4,
-            '5': self.draw_5,
-            '6': self.draw_6,
-            '7': self.draw_7,
-            '8': self.draw_8,
-            '9': self.draw_9,
-            '0': self.draw_0,
-            '.': self.draw_dot,
-        }
+        x, y = start or (0, 0)
+        if self._verbose:
+            self._machine.queue(comment=f"Writing '{text}' at {[x, y]}, {height} mm high", style='turtle')
+        self.penup()
         for char in str(text):
-            draw_char = dispatcher.get(char)
-            start[0] += draw_char(start, height) + scale
+            strokes, width = glyph(char, height, self.tolerance)
+            for stroke in strokes:
+                if self._isdown:
+                    self.penup()
+                self.goto(x+stroke[0][0], y+stroke[0][1])
+                self.pendown()
+                self.polyline([x+point[0] for point in stroke[1:]], [y+point[1] for point in stroke[1:]])
+            x += width + scale
+        self.penup()
+
+################################################################################
+# Turtle.polyline(xs, ys) -- Draw through a run of points at the current height
+#
+# Queued in one go rather than a goto() per point.  Squirtle goes point by point
+# instead, so that every segment extrudes.
+################################################################################
+
+    def polyline(self, xs, ys):
+        self.replay()
+        self._machine.moves(xs, ys, [self._z]*len(xs), li=self._isdown)
+        self._x, self._y = xs[-1], ys[-1]
+
+################################################################################
+# Glyphs -- Stick lettering strokes, traced once per character and height
+#
+# glyph(char, height, tolerance) runs the draw_* method for `char` on a turtle
+# hooked up to a Tracer instead of a machine, and keeps the result: a list of
+# strokes (each a list of (x, y) points to draw through, starting from the
+# glyph's origin) and how wide the glyph is.  Turtle.write() then just moves
+# those strokes to where each character goes.
+################################################################################
+
+GLYPHS = {}
+
+def glyph(char, height, tolerance=None):
+    key = (char, height, tolerance)
+    if key not in GLYPHS:
+        draw = GLYPH_METHODS.get(char)
+        if draw is None:
+            raise ValueError(f"{RED}Turtle.write doesn't know how to draw '{char}'.  Options are: {list(GLYPH_METHODS)}{ENDC}")
+        tracer = Tracer()
+        turtle = Turtle(tracer)
+        turtle.tolerance = tolerance
+        width = getattr(turtle, draw)([0,0], height)
+        GLYPHS[key] = ([stroke for stroke in tracer.strokes if len(stroke) > 1], width)
+    return GLYPHS[key]
+
+GLYPH_METHODS = {
+    'm': 'draw_m',
+    '1': 'draw_1',
+    '2': 'draw_2',
+    '3': 'draw_3',
+    '4': 'draw_4',
+    '5': 'draw_5',
+    '6': 'draw_6',
+    '7': 'draw_7',
+    '8': 'draw_8',
+    '9': 'draw_9',
+    '0': 'draw_0',
+    '.': 'draw_dot',
+}
+
+class Tracer:
+
+    def __init__(self):
+        self.x_offset = 0
+        self.y_offset = 0
+        self.safe_z = 0
+        self._optimize = False
+        self._x = 0
+        self._y = 0
+        self.strokes = []
+        self.stroke = None
+
+    def replay(self):
+        pass
+
+    def queue(self, **kwargs):
+        pass
+
+    def move(self, x=None, y=None, z=None, e=None, li=False, comment=None):
+        if li:
+            if self.stroke is None:
+                self.stroke = [(self._x, self._y)]
+                self.strokes.append(self.stroke)
+            self.stroke.append((x+self.x_offset, y+self.y_offset))
+        else:
+            self.stroke = None
+        self._x, self._y = x+self.x_offset, y+self.y_offset
+
+    def retract(self, x=None, y=None, comment=None):
+        self.stroke = None
+
+    def linear_interpolation(self, z=None, comment=None):
+        pass
 
 ################################################################################
 # Squirtle -- A turtle that extrudes filament
@@ -862,20 +1556,37 @@ class Squirtle(Turtle):
     def pencolor(self):
         self.queue(comment="Pen colors are disabled for Squirtle.  Maybe someday I'll play with multiple extruders.", style='warning')
 
+################################################################################
+# Squirtle.push(distance) -- Add the filament for `distance` of travel to e
+#
+# Returns the comment for the move that pushes it.
+################################################################################
+
+    def push(self, distance):
+        #TODO: Filament object
+        length = self.extrusion_multiplier*(self._machine.nozzle_d*distance*0.2)/(math.pi*(1.75/2)**2)
+        self.e = self.e + length
+        return f"Push {length:.4f}mm of filament"
+
     def forward(self, distance, dz=0, comment=None):
         if self.extrude:
-            #TODO: Filament object
-            self.e = self.e + self.extrusion_multiplier*(self._machine.nozzle_d*distance*0.2)/(math.pi*(1.75/2)**2)
-            comment = f"Push {self.extrusion_multiplier*(self._machine.nozzle_d*distance*0.2)/(math.pi*(1.75/2)**2):.4f}mm of filament"
+            comment = self.push(distance)
         super().forward(distance, dz, self.e, comment)
 
+    def arc_to(self, x, y, i, j, clockwise, e=None, comment=None):
+        if self.extrude:
+            comment = self.push(arc_length(self._x, self._y, x, y, i, j, clockwise))
+        super().arc_to(x, y, i, j, clockwise, self.e, comment)
+
+    def polyline(self, xs, ys):
+        for x, y in zip(xs, ys):
+            self.goto(x, y)
+
     def goto(self, x=None, y=None, z=None, e=None, comment=None):
         if x is None: x = self._x
         if y is None: y = self._y
         if z is None: z = self._z
         if self.extrude:
             distance = ( (x-self._x)**2 + (y-self._y)**2 + (z-self._z)**2 )**0.5
-            #TODO: Filament object
-            self.e = self.e + self.extrusion_multiplier*(self._machine.nozzle_d*distance*0.2)/(math.pi*(1.75/2)**2)
-            comment = f"Push {self.extrusion_multiplier*(self._machine.nozzle_d*distance*0.2)/(math.pi*(1.75/2)**2):.4f}mm of filament"
+            comment = self.push(distance)
         super().goto(x, y, z, self.e, comment)
@@ -0,0 +1,86 @@
+import math
+import pytest
+
+from pygdk.arcs import ArcFitter
+from pygdk.plotter import Plotter
+
+def moves(points, f=500):
+    return [{'code': 'G1', 'x': x, 'y': y, 'z': -1, 'f': f} for x, y in points]
+
+def circle(r, steps, extent=360, start=0):
+    return [(r*math.cos(math.radians(start+extent*n/steps)), r*math.sin(math.radians(start+extent*n/steps))) for n in range(steps+1)]
+
+def fitted(commands):
+    fitter = ArcFitter(0.01)
+    return fitter, list(fitter.process([{'code': 'G90'}] + commands))
+
+def test_arc_fitter_fits_quarter_circle():
+    points = circle(10, 20, extent=90)
+    fitter, commands = fitted(moves(points[:1]) + moves(points[1:]))
+    assert [command['code'] for command in commands] == ['G90', 'G1', 'G17', 'G3']
+    arc = commands[-1]
+    assert (arc['x'], arc['y']) == points[-1]
+    assert math.hypot(arc['i'], arc['j']) == pytest.approx(10)
+    assert (fitter.arcs, fitter.segments) == (1, 20)
+
+def test_arc_fitter_clockwise():
+    points = circle(5, 24, extent=-120)
+    fitter, commands = fitted(moves(points))
+    assert commands[-1]['code'] == 'G2'
+
+def test_arc_fitter_keeps_points_within_tolerance():
+    points = circle(10, 100)
+    fitter, commands = fitted(moves(points))
+    x, y = points[0]
+    for arc in commands[3:]:
+        c_x, c_y = x+arc['i'], y+arc['j']
+        assert arc['code'] == 'G3'
+        x, y = arc['x'], arc['y']
+        assert abs(math.hypot(x-c_x, y-c_y) - math.hypot(arc['i'], arc['j'])) < 1e-9
+    assert fitter.segments == 100
+    assert 1 < fitter.arcs < 5
+
+def test_arc_fitter_leaves_lines_and_corners_alone():
+    points = [(0, 0), (1, 0), (2, 0), (3, 0), (3, 1), (3, 2), (3, 3)]
+    fitter, commands = fitted(moves(points))
+    assert fitter.arcs == 0
+    assert len(commands) == len(points) + 1
+
+def test_arc_fitter_needs_absolute_and_constant_z():
+    points = circle(10, 20, extent=90)
+    fitter = ArcFitter(0.01)
+    assert list(fitter.process([{'code': 'G91'}] + moves(points)))[-1]['code'] == 'G1'
+    ramp = [{'code': 'G1', 'x': x, 'y': y, 'z': -n, 'f': 500} for n, (x, y) in enumerate(points)]
+    assert fitted(ramp)[0].arcs == 0
+
+def test_machine_arc_tolerance():
+    plotter = Plotter('onefinity.json')
+    plotter.feed = 500
+    turtle = plotter.turtle(z=-1)
+    turtle.pendown()
+    turtle.circle(10, steps=100)
+    plain = list(plotter.iter_gcode('production'))
+    plotter.arc_tolerance = 0.01
+    arcs = list(plotter.iter_gcode('production'))
+    assert len(arcs) < len(plain) - 90
+    assert 'G17' in arcs
+    assert plotter.stages[0].segments >= 99
+
+def test_arc_fitter_window_matches_whole_run():
+    points = []
+    for turn in range(20):
+        points += circle(10 + turn, 90, start=turn)[1:]
+    commands = [{'code': 'G90'}] + moves([(11, 0)]) + moves(points)
+    whole = ArcFitter(0.01, max_segments=64)
+    whole.window = len(commands)
+    windowed = ArcFitter(0.01, max_segments=64)
+    windowed.window = 200
+    assert list(windowed.process(commands)) == list(whole.process(commands))
+    assert windowed.arcs == whole.arcs > 10
+
+def test_arc_fitter_holds_at_most_a_window():
+    fitter = ArcFitter(0.01, max_segments=16)
+    fitter.window = 50
+    stream = fitter.process([{'code': 'G90'}] + moves([(0, 0)]) + moves(circle(10, 5000)), final=False)
+    for command in stream:
+        assert len(fitter.run) < 50
@@ -0,0 +1,99 @@
+import gzip
+import io
+import pytest
+
+from pygdk.binary import decode, expand
+from pygdk.fdm_printer import FDMPrinter
+from pygdk.mill import Mill
+
+def job():
+    mill = Mill('onefinity.json')
+    mill.tool = '1/4" Downcut'
+    mill.material = 'Soft Wood'
+    mill.feed = 500
+    for i in range(5000):
+        mill.cut(i/3, -i/7, -1, comment=f"Cut {i % 3}")
+    mill.helix(0, 0, 10, 5)
+    return mill
+
+def test_save_gcode_gzip(tmp_path):
+    mill = job()
+    mill.save_gcode(tmp_path / 'job.nc.gz')
+    with gzip.open(tmp_path / 'job.nc.gz', 'rt') as file:
+        assert file.read() == "\n".join(mill.iter_gcode('production'))
+
+def test_save_gcode_zstd(tmp_path):
+    zstandard = pytest.importorskip('zstandard')
+    mill = job()
+    mill.save_gcode(tmp_path / 'job.nc', compression='zstd')
+    with open(tmp_path / 'job.nc', 'rb') as file:
+        text = zstandard.ZstdDecompressor().stream_reader(file).read().decode()
+    assert text == "\n".join(mill.iter_gcode('production'))
+
+def test_unknown_compression(tmp_path):
+    with pytest.raises(ValueError):
+        job().save_gcode(tmp_path / 'job.nc', compression='rar')
+
+def test_spool_gcode_compressed():
+    mill = job()
+    with mill.spool_gcode(compression='gzip') as spool:
+        assert gzip.decompress(spool.read()).decode() == "\n".join(mill.iter_gcode('production'))
+
+def test_binary_round_trip(tmp_path):
+    kossel = FDMPrinter('kossel.json')
+    kossel.rapid(1, 2, 3, comment="Rapid")
+    kossel.queue(code='G2', x=1, y=1, i=0, j=1, p=3)
+    kossel.save_binary(tmp_path / 'job.gcb')
+    header, blocks = decode(tmp_path / 'job.gcb')
+    assert header['Name'] == 'Kossel'
+    commands = [command for queue in blocks for command in queue]
+    end = [{'code': code, 'comment': comment} for code, comment in kossel.dict['End G-Code']]
+    assert commands == list(kossel.command_queue) + end
+
+@pytest.mark.parametrize('filename', ['job.gcb', 'job.gcb.gz'])
+def test_binary_expands_to_production_gcode(tmp_path, filename):
+    mill = job()
+    mill.save_binary(tmp_path / filename)
+    assert list(expand(tmp_path / filename)) == list(mill.iter_gcode('production'))
+
+def test_binary_blocks_share_one_table(tmp_path):
+    mill = Mill('onefinity.json')
+    mill.feed = 500
+    for i in range(10000):
+        mill.cut(i, -i, -1, comment=f"Cut {i}")
+    mill.save_binary(tmp_path / 'job.gcb')
+    header, blocks = decode(tmp_path / 'job.gcb')
+    queues = list(blocks)
+    assert len(queues) > 1
+    assert all(queue.table is queues[0].table for queue in queues)
+    commands = [command for queue in queues for command in queue]
+    assert commands[:len(mill.command_queue)] == list(mill.command_queue)
+
+def test_binary_is_compact(tmp_path):
+    mill = job()
+    mill.save_binary(tmp_path / 'job.gcb.gz')
+    mill.save_gcode(tmp_path / 'job.nc')
+    assert (tmp_path / 'job.gcb.gz').stat().st_size * 4 < (tmp_path / 'job.nc').stat().st_size
+
+def test_decode_rejects_other_files():
+    with pytest.raises(ValueError):
+        decode(io.BytesIO(b'G0 X1 Y2'))
+
+def test_decode_closes_files_it_opens(tmp_path, monkeypatch):
+    mill = job()
+    mill.save_binary(tmp_path / 'job.gcb')
+    (tmp_path / 'job.txt').write_text('G0 X1 Y2')
+    opened = []
+    def tracking_open(*args, **kwargs):
+        opened.append(open(*args, **kwargs))
+        return opened[-1]
+    monkeypatch.setattr('pygdk.binary.open', tracking_open, raising=False)
+    header, blocks = decode(tmp_path / 'job.gcb')
+    list(blocks)
+    header, blocks = decode(tmp_path / 'job.gcb')
+    next(blocks)
+    blocks.close()
+    with pytest.raises(ValueError):
+        decode(tmp_path / 'job.txt')
+    assert len(opened) == 3
+    assert all(file.closed for file in opened)
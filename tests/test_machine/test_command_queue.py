@@ -0,0 +1,66 @@
+import sys
+import pytest
+
+from pygdk.command_queue import CommandQueue
+from pygdk.mill import Mill
+
+def test_command_queue_round_trip():
+    queue = CommandQueue()
+    queue.append({'code': 'G1', 'x': 1, 'y': -2.5, 'f': 500, 'comment': 'Cut'})
+    queue.append({'comment': 'Just a comment', 'style': 'machine'})
+    queue.append({'code': 'G2', 'z': -3, 'i': 0, 'j': 0, 'p': 4})
+    assert len(queue) == 3
+    assert queue[0] == {'code': 'G1', 'x': 1.0, 'y': -2.5, 'f': 500.0, 'comment': 'Cut'}
+    assert queue[1] == {'comment': 'Just a comment', 'style': 'machine'}
+    assert queue[-1] == {'code': 'G2', 'z': -3.0, 'i': 0.0, 'j': 0.0, 'p': 4}
+    assert list(queue) == queue[0:3]
+
+def test_command_queue_none_is_absent():
+    queue = CommandQueue()
+    queue.append({'code': 'G0', 'x': None, 'y': 0, 'comment': None})
+    assert queue[0] == {'code': 'G0', 'y': 0.0}
+
+def test_command_queue_interns_strings():
+    queue = CommandQueue()
+    for i in range(1000):
+        queue.append({'code': 'G1', 'x': i, 'style': 'turtle'})
+    assert len(queue._table) == 2
+
+def test_command_queue_unknown_word():
+    queue = CommandQueue()
+    with pytest.raises(TypeError):
+        queue.append({'code': 'G1', 'q': 1})
+
+def test_command_queue_bad_value_leaves_columns_lined_up():
+    queue = CommandQueue()
+    queue.append({'code': 'G1', 'x': 1})
+    with pytest.raises(ValueError):
+        queue.append({'code': 'G1', 'x': 2, 'y': 'abc'})
+    with pytest.raises(ValueError):
+        queue.extend_block('G1', {'x': [3, 4], 'y': [5, 'abc']})
+    with pytest.raises(ValueError):
+        queue.extend_block('G1', {'x': [3, 4], 'y': [5]})
+    queue.append({'code': 'G0', 'y': 6})
+    assert list(queue) == [{'code': 'G1', 'x': 1.0}, {'code': 'G0', 'y': 6.0}]
+    assert len(queue._values) == 2
+
+def test_command_queue_index_error():
+    queue = CommandQueue()
+    with pytest.raises(IndexError):
+        queue[0]
+
+def test_command_queue_smaller_than_dicts():
+    queue = CommandQueue()
+    dicts = []
+    for i in range(1000):
+        command = {'code': 'G1', 'x': i/3, 'y': i/7, 'z': -1.0, 'e': None, 'f': 500.0, 'comment': None}
+        queue.append(command)
+        dicts.append(command)
+    dict_bytes = sum(sys.getsizeof(d) + sum(sys.getsizeof(v) for v in d.values()) for d in dicts)
+    assert queue.nbytes() * 8 < dict_bytes
+
+def test_machine_queue_uses_command_queue():
+    mill = Mill('onefinity.json')
+    mill.queue(code='G0', x=1, y=2, f=mill.max_feed, comment='Rapid')
+    assert isinstance(mill.command_queue, CommandQueue)
+    assert mill.command_queue[-1] == {'code': 'G0', 'x': 1.0, 'y': 2.0, 'f': 10000.0, 'comment': 'Rapid'}
@@ -0,0 +1,42 @@
+import random
+import pytest
+
+from pygdk.command_queue import CommandQueue
+from pygdk.formatter import Formatter, fixed
+from pygdk.mill import Mill
+
+def test_fixed_matches_fstrings():
+    numpy = pytest.importorskip('numpy')
+    random.seed(4)
+    values = [random.uniform(-1000, 1000) for _ in range(10000)]
+    values += [round(random.uniform(-10, 10), 5) for _ in range(10000)]
+    values += [0.0, -0.0, 0.00005, -0.00005, 2.5, 9.99995, 1e20, float('nan'), float('inf')]
+    for digits in range(7):
+        assert fixed(numpy.array(values), digits, ' X').tolist() == [f" X{value:.{digits}f}" for value in values]
+
+def test_vector_and_scalar_paths_match():
+    pytest.importorskip('numpy')
+    queue = CommandQueue()
+    for i in range(500):
+        queue.append({'code': 'G1', 'x': i/3, 'y': -i/7, 'z': -1, 'f': 500, 'comment': None if i % 5 else f"Cut {i}"})
+    queue.append({'code': 'G2', 'x': 1, 'y': 1, 'i': 0, 'j': 1, 'p': 3})
+    queue.append({'comment': 'Just a comment', 'style': 'machine'})
+    note = lambda comment, style: f" ; {comment} ({style})"
+    formatter = Formatter()
+    vector = formatter.lines(queue, 0, len(queue), note)
+    formatter.vectorize = False
+    assert vector == formatter.lines(queue, 0, len(queue), note)
+    assert vector == [formatter.line(command, note) for command in queue]
+
+def test_precision_per_word():
+    formatter = Formatter({'X': 2, 'F': 0})
+    assert formatter.line({'code': 'G1', 'x': 1.23456, 'y': 1.23456, 'f': 500.4}, None) == 'G1 X1.23 Y1.2346 F500'
+
+def test_precision_unknown_word():
+    with pytest.raises(ValueError):
+        Formatter({'Q': 3})
+
+def test_default_precision_is_four_places():
+    mill = Mill('onefinity.json')
+    mill.rapid(1, 2, 3)
+    assert mill.format_command(mill.command_queue[-1]).startswith('G0 X1.0000 Y2.0000')
@@ -0,0 +1,180 @@
+import io
+import math
+import pytest
+
+from pygdk.fdm_printer import FDMPrinter
+from pygdk.mill import Mill
+
+def test_iter_gcode_matches_generate_gcode():
+    mill = Mill('onefinity.json')
+    mill.feed = 500
+    mill.rapid(1, 2, 3, comment="Rapid")
+    mill.cut(4, 5, 6)
+    mill.generate_gcode()
+    assert mill.gcode == "\n".join(mill.iter_gcode())
+
+def test_iter_gcode_ends_with_end_gcode():
+    kossel = FDMPrinter('kossel.json')
+    lines = list(kossel.iter_gcode())
+    assert [line.split(';')[0] for line in lines[-3:]] == ['M104 S0', 'G28', 'M84']
+    assert len(kossel.command_queue) == len(lines) - 3
+
+def test_save_gcode_streams_in_chunks(tmp_path):
+    mill = Mill('onefinity.json')
+    mill.feed = 500
+    for i in range(10000):
+        mill.cut(i, -i, -1)
+    filename = tmp_path / 'chunks.nc'
+    mill.save_gcode(filename, profile='debug')
+    mill.generate_gcode()
+    assert filename.read_text() == mill.gcode
+
+def test_spool_gcode_is_bytes_of_gcode():
+    mill = Mill('onefinity.json')
+    mill.rapid(1, 2, 3)
+    mill.generate_gcode('production')
+    with mill.spool_gcode() as spool:
+        assert spool.read() == mill.gcode.encode()
+
+def test_sink_matches_generated_gcode(tmp_path):
+    filename = tmp_path / 'sink.nc'
+    streamed = Mill('onefinity.json', sink=filename)
+    streamed.sink_window = 16
+    generated = Mill('onefinity.json')
+    for mill in (streamed, generated):
+        mill.feed = 500
+        for i in range(1000):
+            mill.cut(i, -i, -1)
+    assert len(streamed.command_queue) < 2*streamed.sink_window
+    streamed.close_sink()
+    generated.generate_gcode('production')
+    assert filename.read_text() == generated.gcode
+
+def test_sink_keeps_queue_bounded():
+    sink = io.StringIO()
+    mill = Mill('onefinity.json', sink=sink)
+    mill.feed = 500
+    for i in range(10000):
+        mill.cut(i, -i, -1, comment=f"Cut {i}")
+        assert len(mill.command_queue) < 2*mill.sink_window
+    assert len(mill.command_queue._table) < 2*mill.sink_window
+    mill.close_sink()
+    assert len(sink.getvalue().split("\n")) > 10000
+
+def test_sink_cannot_regenerate(tmp_path):
+    mill = Mill('onefinity.json', sink=tmp_path / 'sink.nc')
+    with pytest.raises(ValueError):
+        mill.generate_gcode()
+
+def test_production_profile_has_no_comments_or_colors():
+    mill = Mill('onefinity.json')
+    mill.feed = 500
+    mill.bolt_circle(0, 0, 4, 10)
+    gcode = "\n".join(mill.iter_gcode('production'))
+    assert ';' not in gcode and '\033' not in gcode
+    assert all(gcode.split("\n"))
+
+def test_annotated_profile_comments_feature_boundaries():
+    mill = Mill('onefinity.json')
+    mill.feed = 500
+    mill.bolt_circle(0, 0, 4, 10)
+    comments = [line for line in mill.iter_gcode('annotated') if ';' in line]
+    assert comments[0].startswith('; Bolt Circle |')
+    assert comments[-1] == '; Bolt Circle | END'
+    assert not any('\033' in line for line in comments)
+
+def test_debug_profile_is_default():
+    mill = Mill('onefinity.json')
+    mill.rapid(1, 2, 3, comment="Rapid")
+    mill.generate_gcode()
+    assert mill.gcode == "\n".join(mill.iter_gcode('debug'))
+    assert '\033' in mill.gcode
+
+def test_unknown_profile():
+    mill = Mill('onefinity.json')
+    with pytest.raises(ValueError):
+        mill.generate_gcode('verbose')
+
+def test_generation_picks_up_commands_queued_later():
+    incremental = Mill('onefinity.json')
+    complete = Mill('onefinity.json')
+    incremental.cache_gcode = True
+    for mill in (incremental, complete):
+        mill.feed = 500
+        mill.arc_tolerance = 0.01
+    points = [(10*math.cos(math.radians(a)), 10*math.sin(math.radians(a)), -1) for a in range(0, 360, 5)]
+    for mill in (incremental, complete):
+        mill.rapid(10, 0, -1)
+        for point in points[:40]:
+            mill.cut(*point)
+    first = list(incremental.iter_gcode('production'))
+    assert list(incremental.iter_gcode('production')) == first
+    for mill in (incremental, complete):
+        for point in points[40:]:
+            mill.cut(*point)
+    assert list(incremental.iter_gcode('production')) == list(complete.iter_gcode('production'))
+    assert list(incremental.iter_gcode()) == list(complete.iter_gcode())
+    assert incremental.stages[0].arcs == complete.stages[0].arcs > 0
+
+def test_generation_only_formats_new_commands():
+    mill = Mill('onefinity.json')
+    mill.feed = 500
+    mill.cache_gcode = True
+    for i in range(100):
+        mill.cut(i, -i, -1)
+    mill.generate_gcode('production')
+    rendering = mill._renderings['production']
+    assert rendering.stop == len(mill.command_queue)
+    lines = len(rendering)
+    mill.generate_gcode('production')
+    assert len(rendering) == lines
+    mill.cut(0, 0, 0)
+    mill.generate_gcode('production')
+    assert mill._renderings['production'] is rendering
+    assert len(rendering) == lines + 1
+
+def test_generation_is_incremental_by_default():
+    mill = Mill('onefinity.json')
+    mill.feed = 500
+    mill.cut(1, 2, 3)
+    mill.generate_gcode('production')
+    mill.generate_gcode('debug')
+    assert set(mill._renderings) == {'production', 'debug'}
+    mill.cache_gcode = False
+    mill.generate_gcode('production')
+    assert mill._renderings == {}
+
+def test_abandoned_generation_drops_cache():
+    mill = Mill('onefinity.json')
+    mill.feed = 500
+    mill.cache_gcode = True
+    for i in range(100):
+        mill.cut(i, -i, -1)
+    lines = mill.iter_gcode('production')
+    next(lines)
+    lines.close()
+    assert 'production' not in mill._renderings
+    mill.cut(0, 0, 0)
+    cached = list(mill.iter_gcode('production'))
+    mill.cache_gcode = False
+    assert cached == list(mill.iter_gcode('production'))
+
+def test_changed_settings_render_again():
+    mill = Mill('onefinity.json')
+    mill.feed = 500
+    mill.cut(1, 2, 3)
+    mill.cut(1, 2, 4)
+    mill.generate_gcode('production')
+    assert mill.gcode.split("\n")[-1] == 'Z4.0000'
+    mill.elide = False
+    mill.generate_gcode('production')
+    assert mill.gcode.split("\n")[-1] == 'G1 X1.0000 Y2.0000 Z4.0000 F500.0000'
+    mill.formatter.precision['z'] = 2
+    mill.generate_gcode('production')
+    assert mill.gcode.split("\n")[-1] == 'G1 X1.0000 Y2.0000 Z4.00 F500.0000'
+
+def test_go_ends_with_end_gcode_once(capsys):
+    kossel = FDMPrinter('kossel.json')
+    kossel.go()
+    out = capsys.readouterr().out
+    assert out.count('M84') == 1
@@ -0,0 +1,82 @@
+import pytest
+
+from pygdk.command_queue import CommandQueue
+from pygdk.formatter import Formatter
+from pygdk.modal import ModalState
+from pygdk.fdm_printer import FDMPrinter
+from pygdk.mill import Mill
+
+def elided(commands, modal_motion=True, vectorize=False):
+    queue = CommandQueue(commands)
+    formatter = Formatter()
+    formatter.vectorize = vectorize
+    formatter.min_block = 1
+    modal = ModalState(formatter.precision, modal_motion)
+    modal.vectorize = vectorize
+    modal.min_block = 1
+    return formatter.lines(queue, 0, len(queue), lambda comment, style: "", modal)
+
+def test_modal_elision_drops_repeated_words():
+    lines = elided([
+        {'code': 'G90'},
+        {'code': 'G1', 'x': 1, 'y': 2, 'z': -1, 'f': 500},
+        {'code': 'G1', 'x': 3, 'y': 2, 'z': -1, 'f': 500},
+        {'code': 'G1', 'x': 3, 'y': 2, 'z': -1, 'f': 500},
+        {'code': 'G0', 'x': 3, 'y': 2, 'z': 5, 'f': 10000},
+    ])
+    assert lines == ['G90', 'G1 X1.0000 Y2.0000 Z-1.0000 F500.0000', 'X3.0000', '', 'G0 Z5.0000 F10000.0000']
+
+def test_modal_elision_keeps_arcs():
+    lines = elided([
+        {'code': 'G90'},
+        {'code': 'G1', 'x': 1, 'y': 0, 'f': 500},
+        {'code': 'G2', 'i': -1, 'j': 0, 'f': 500},
+        {'code': 'G2', 'i': -1, 'j': 0, 'f': 500},
+    ])
+    assert lines[2:] == ['G2 I-1.0000 J0.0000', 'G2 I-1.0000 J0.0000']
+
+def test_modal_elision_incremental_keeps_axes():
+    lines = elided([
+        {'code': 'G91'},
+        {'code': 'G1', 'x': 1, 'f': 500},
+        {'code': 'G1', 'x': 1, 'f': 500},
+    ])
+    assert lines == ['G91', 'G1 X1.0000 F500.0000', 'X1.0000']
+
+def test_modal_elision_forgets_after_other_codes():
+    lines = elided([
+        {'code': 'G90'},
+        {'code': 'G1', 'x': 1, 'f': 500},
+        {'code': 'M6 T2'},
+        {'code': 'G1', 'x': 1, 'f': 500},
+    ], modal_motion=False)
+    assert lines == ['G90', 'G1 X1.0000 F500.0000', 'M6 T2', 'G1 X1.0000 F500.0000']
+
+def test_modal_elision_vector_matches_scalar():
+    pytest.importorskip('numpy')
+    commands = [{'code': 'G90'}]
+    for i in range(500):
+        commands.append({'code': 'G1' if i % 3 else 'G0', 'x': i // 4, 'y': i % 7, 'z': -1, 'f': 500 + 10*(i % 2), 'comment': 'Cut'})
+        if i % 50 == 0:
+            commands.append({'code': 'G91' if i % 100 else 'G90'})
+        if i % 70 == 0:
+            commands.append({'code': 'G2', 'i': 1, 'j': 0, 'f': 500})
+    assert elided(commands) == elided(commands, vectorize=True)
+    assert elided(commands, False) == elided(commands, False, vectorize=True)
+
+def test_production_profile_is_elided():
+    mill = Mill('onefinity.json')
+    mill.feed = 500
+    for i in range(10):
+        mill.cut(i, 0, -1)
+    lines = list(mill.iter_gcode('production'))
+    assert lines[1:4] == ['G1 X0.0000 Y0.0000 Z-1.0000 F500.0000', 'X1.0000', 'X2.0000']
+    mill.elide = False
+    assert list(mill.iter_gcode('production'))[2] == 'G1 X1.0000 Y0.0000 Z-1.0000 F500.0000'
+
+def test_octoprint_keeps_motion_words():
+    kossel = FDMPrinter('kossel.json')
+    kossel.rapid(1, 2, 3)
+    kossel.rapid(4, 2, 3)
+    assert not kossel.modal_motion
+    assert 'G0 X4.0000' in list(kossel.iter_gcode('production'))
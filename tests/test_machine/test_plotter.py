@@ -27,3 +27,50 @@ def test_plotter_conf_not_provided():
 def test_plotter_conf_with_no_plotter():
     with pytest.raises(KeyError):
         plotter = Plotter('tests/bad_tt.json')
+
+def test_plotter_improve_budget():
+    plotter = Plotter('onefinity.json')
+    plotter.feed = 5000
+    turtle = plotter.turtle(z_draw=-123)
+    turtle.goto(0, 0)
+    plotter._optimize = True
+    plotter.improve_budget = 1
+    for n in range(50):
+        plotter.pen_color = 'Black' if n % 2 else 'Red'
+        turtle.goto(n*7 % 100, n*13 % 100)
+    plotter.pen_color = None
+    for color in ('Black', 'Red'):
+        before, after = plotter.pen_up_travel[color]
+        assert after <= before
+
+def plot_in_colors(processes):
+    plotter = Plotter('onefinity.json')
+    plotter.feed = 5000
+    turtle = plotter.turtle(z_draw=-123)
+    turtle.goto(0, 0)
+    plotter._optimize = True
+    plotter.processes = processes
+    for n in range(60):
+        plotter.pen_color = ['Black', 'Red', 'Blue'][n % 3]
+        turtle.goto(n*7 % 100, n*13 % 100)
+    plotter.pen_color = None
+    return list(plotter.command_queue)
+
+def test_plotter_process_pool():
+    assert plot_in_colors(2) == plot_in_colors(1)
+
+def test_plotter_dedup_is_opt_in():
+    drawn = []
+    for tolerance in (None, 0.001):
+        plotter = Plotter('onefinity.json')
+        plotter.feed = 5000
+        turtle = plotter.turtle(z_draw=-123)
+        turtle.goto(0, 0)
+        plotter._optimize = True
+        plotter.dedup_tolerance = tolerance
+        plotter.pen_color = 'Black'
+        turtle.forward(10)
+        turtle.back(10)
+        plotter.pen_color = None
+        drawn.append(sum(1 for row in plotter.command_queue if row.get('comment') == 'Draw next line'))
+    assert drawn == [2, 1]
@@ -0,0 +1,73 @@
+import math
+import random
+
+from pygdk.simplify import Simplifier, douglas_peucker, segment_distance
+from pygdk.mill import Mill
+
+def moves(points, f=500):
+    return [{'code': 'G1', 'x': x, 'y': y, 'z': z, 'f': f} for x, y, z in points]
+
+def test_simplifier_drops_collinear_moves():
+    simplifier = Simplifier(0.01)
+    points = [(n, 2*n, -1) for n in range(11)]
+    commands = list(simplifier.process([{'code': 'G90'}] + moves(points)))
+    assert commands[1:] == moves([(0, 0, -1), (10, 20, -1)])
+    assert (simplifier.removed, simplifier.segments) == (9, 10)
+    assert simplifier.report() == "Simplification removed 9 of 10 moves"
+
+def test_douglas_peucker_max_deviation():
+    random.seed(8)
+    points = [(0, 0, 0)]
+    for n in range(2000):
+        x, y, z = points[-1]
+        points.append((x + 0.1, y + random.uniform(-0.02, 0.02), z + random.uniform(-0.01, 0.01)))
+    keep = douglas_peucker(points, 0.05)
+    kept = [n for n in range(len(points)) if keep[n]]
+    assert len(kept) < len(points) / 4
+    for first, last in zip(kept, kept[1:]):
+        for n in range(first+1, last):
+            assert segment_distance(points[n], points[first], points[last]) <= 0.05
+
+def test_simplifier_fills_in_omitted_axes():
+    simplifier = Simplifier(0.01)
+    commands = [{'code': 'G90'}, {'code': 'G1', 'x': 0, 'y': 0, 'z': 0}, {'code': 'G1', 'x': 1}, {'code': 'G1', 'x': 2}, {'code': 'G1', 'y': 1}]
+    assert list(simplifier.process(commands))[-2:] == [{'code': 'G1', 'x': 2, 'y': 0, 'z': 0}, {'code': 'G1', 'x': 2, 'y': 1, 'z': 0}]
+
+def test_simplifier_needs_absolute_extrusion():
+    points = [(n, 0, 0.2) for n in range(5)]
+    extruding = [dict(move, e=n) for n, move in enumerate(moves(points))]
+    relative = Simplifier(0.01)
+    list(relative.process([{'code': 'G90'}, {'code': 'M83'}] + extruding))
+    assert relative.removed == 0
+    absolute = Simplifier(0.01)
+    list(absolute.process([{'code': 'G90'}, {'code': 'M82'}] + extruding))
+    assert absolute.removed == 3
+
+def test_machine_simplify_tolerance():
+    mill = Mill('onefinity.json')
+    mill.feed = 500
+    for n in range(100):
+        mill.cut(n, 0.001*(n % 2), -1)
+    mill.simplify_tolerance = 0.01
+    gcode = list(mill.iter_gcode())
+    assert any('Simplification removed 98 of 99 moves' in line for line in gcode)
+    assert len(list(mill.iter_gcode('production'))) < 10
+
+def test_simplifier_window_keeps_tolerance():
+    random.seed(9)
+    points = [(0, 0, -1)]
+    for n in range(3000):
+        x, y, z = points[-1]
+        points.append((x + 0.1, y + random.uniform(-0.02, 0.02), z))
+    simplifier = Simplifier(0.05)
+    simplifier.window = 500
+    commands = list(simplifier.process([{'code': 'G90'}] + moves(points[:1]) + moves(points[1:]), final=False))
+    assert len(simplifier.run) < 500
+    commands += list(simplifier.flush())
+    kept = [(0, 0, -1)] + [(command['x'], command['y'], command['z']) for command in commands[2:]]
+    assert kept[-1] == points[-1]
+    k = 0
+    for point in points:
+        while segment_distance(point, kept[k], kept[min(k+1, len(kept)-1)]) > 0.05:
+            k += 1
+    assert len(kept) < len(points) / 4
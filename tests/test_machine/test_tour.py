@@ -0,0 +1,93 @@
+import random
+
+from pygdk.tour import dsq, order, greedy, chain, improve, travel, dedup
+
+def brute_force(pairs, pos):
+    remaining = list(pairs)
+    tour = []
+    while remaining:
+        shortest = None
+        winner = None
+        for pair in remaining:
+            for point in pair:
+                ds = dsq(pos, point)
+                if shortest is None or ds < shortest:
+                    shortest = ds
+                    winner = pair
+        remaining.remove(winner)
+        points = order(winner, pos)
+        tour.append(points)
+        pos = points[1]
+    return tour
+
+def test_greedy_matches_brute_force():
+    rng = random.Random(1)
+    for _ in range(10):
+        pairs = [[[rng.uniform(0, 500), rng.uniform(0, 300)], [rng.uniform(0, 500), rng.uniform(0, 300)]] for _ in range(300)]
+        assert greedy(pairs, [0, 0]) == brute_force(pairs, [0, 0])
+
+def test_greedy_ties_go_to_first_queued():
+    rng = random.Random(2)
+    for _ in range(10):
+        pairs = [[[rng.randint(0, 10), rng.randint(0, 10)], [rng.randint(0, 10), rng.randint(0, 10)]] for _ in range(200)]
+        assert greedy(pairs, [5, 5]) == brute_force(pairs, [5, 5])
+
+def test_greedy_clustered_and_empty():
+    pairs = [[[0, 0], [1, 0]], [[1000, 1000], [1001, 1000]], [[2, 0], [1, 0]], [[1000, 1000], [1000, 1000]]]
+    assert greedy(pairs, [0, 0]) == brute_force(pairs, [0, 0])
+    assert greedy([], [0, 0]) == []
+
+def test_greedy_strokes_enter_at_either_end():
+    strokes = [[[10, 0], [5, 5], [0, 0]], [[20, 0], [30, 0]]]
+    assert greedy(strokes, [1, 0]) == [[[0, 0], [5, 5], [10, 0]], [[20, 0], [30, 0]]]
+
+def test_chain_closes_polygons():
+    square = [[[0, 0], [10, 0]], [[10, 0], [10, 10]], [[10, 10], [0, 10]], [[0, 10], [0, 0]]]
+    assert chain(square, 0.001) == [[[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]]]
+
+def test_chain_turns_lines_around():
+    pairs = [[[5, 0], [10, 0]], [[20, 0], [10, 0.0005]], [[0, 0], [5, 0]], [[50, 50], [60, 60]]]
+    assert chain(pairs, 0.001) == [[[0, 0], [5, 0], [10, 0], [20, 0]], [[50, 50], [60, 60]]]
+
+def test_chain_tolerance():
+    pairs = [[[0, 0], [10, 0]], [[10.01, 0], [20, 0]]]
+    assert len(chain(pairs, 0.001)) == 2
+    assert len(chain(pairs, 0.1)) == 1
+    assert len(chain(pairs, 0)) == 2
+
+def test_improve_shortens_travel():
+    rng = random.Random(3)
+    pairs = []
+    for _ in range(500):
+        x, y = rng.uniform(0, 500), rng.uniform(0, 300)
+        pairs.append([[x, y], [x+rng.uniform(-5, 5), y+rng.uniform(-5, 5)]])
+    tour = greedy(pairs, [0, 0])
+    better = improve(tour, [0, 0], 10)
+    assert travel(better, [0, 0]) < 0.95*travel(tour, [0, 0])
+    key = lambda stroke: sorted([tuple(stroke[0]), tuple(stroke[-1])])
+    assert sorted(map(key, better)) == sorted(map(key, tour))
+
+def test_improve_uncrosses():
+    tour = [[[0, 0], [1, 0]], [[10, 10], [11, 10]], [[2, 0], [3, 0]], [[12, 10], [13, 10]]]
+    assert improve(tour, [0, 0], 1) == [[[0, 0], [1, 0]], [[2, 0], [3, 0]], [[10, 10], [11, 10]], [[12, 10], [13, 10]]]
+
+def test_improve_without_budget():
+    tour = [[[0, 0], [1, 0]], [[10, 10], [11, 10]], [[2, 0], [3, 0]]]
+    assert improve(tour, [0, 0], 0) == tour
+    assert improve([], [0, 0], 1) == []
+
+def test_dedup_exact_and_reversed():
+    pairs = [[[0, 0], [10, 0]], [[0, 0], [10, 0]], [[10, 0], [0, 0]], [[10, 0.0005], [0, -0.0005]]]
+    assert dedup(pairs, 0.001) == [[[0, 0], [10, 0]]]
+
+def test_dedup_collinear_overlap():
+    pairs = [[[0, 0], [10, 0]], [[15, 0], [-5, 0]], [[5, 5], [5, 0]]]
+    assert dedup(pairs, 0.001) == [[[0, 0], [10, 0]], [[0.0, 0.0], [-5, 0]], [[15, 0], [10.0, 0.0]], [[5, 5], [5, 0]]]
+
+def test_dedup_leaves_distinct_lines_alone():
+    rng = random.Random(4)
+    pairs = [[[rng.uniform(0, 500), rng.uniform(0, 300)], [rng.uniform(0, 500), rng.uniform(0, 300)]] for _ in range(200)]
+    pairs += [[[0, 0], [10, 0]], [[10, 0], [20, 0]], [[0, 0.01], [10, 0.01]]]
+    result = dedup(pairs, 0.001)
+    assert result == pairs
+    assert all(a is b for a, b in zip(result, pairs))
@@ -1,3 +1,6 @@
+import math
+import random
+from pygdk.turtle import planar, chords, expand, glyph
 from pygdk.plotter import Plotter
 machine = Plotter('onefinity.json')
 
@@ -266,7 +269,7 @@ def test_home_pen_up():
     assert turtle.pos()     != [0,0,0]
     assert turtle._heading  != [1,0,0]
     turtle.home()
-    assert turtle.pos()     == [0,0,10]
+    assert turtle.pos()     == [0,0,machine.safe_z]
     assert turtle._heading  == [1,0,0]
 
 def test_home_pen_down():
@@ -314,3 +317,188 @@ def test_smooth_circle_cw():
     assert round(turtle._heading[1],12) == 0
     assert round(turtle._heading[2],12) == 0
     # TODO: Figure out exact math.  SymPy maybe?
+
+def test_planar_headings_are_cached():
+    planar.cache_clear()
+    turtle = machine.turtle()
+    for i in range(600):
+        turtle.left(60)
+    assert turtle._heading  == [1,0,0]
+    assert planar.cache_info().misses == 6
+
+def test_planar_matches_3d():
+    flat = machine.turtle()
+    tipped = machine.turtle()
+    tipped.roll(90)
+    tipped.roll(-90)
+    tipped._angle = None # Force the 3D path
+    for turtle in (flat, tipped):
+        for i in range(1000):
+            turtle.left(7)
+            turtle.forward(1)
+    for a, b in zip(flat.pos() + list(flat._heading), tipped.pos() + list(tipped._heading)):
+        assert math.isclose(a, b, abs_tol=1e-9)
+
+def test_roll_leaves_the_plane():
+    turtle = machine.turtle()
+    turtle.roll(90)
+    assert turtle._angle is None
+    turtle.roll(-90)
+    assert turtle._angle == 0
+
+def draw(turtle):
+    turtle.pendown()
+    for i in range(500):
+        turtle.forward(0.5)
+        turtle.left(7.3)
+        if i % 100 == 99:
+            turtle.right(90)
+            turtle.penup()
+            turtle.forward(2)
+            turtle.pendown()
+
+def test_recording_matches_direct():
+    direct = Plotter('onefinity.json')
+    recorded = Plotter('onefinity.json')
+    for plotter in (direct, recorded):
+        plotter.feed = 500
+    first = direct.turtle(z=-1, verbose=True)
+    draw(first)
+    second = recorded.turtle(z=-1, verbose=True)
+    with second.recording():
+        draw(second)
+    assert list(recorded.iter_gcode()) == list(direct.iter_gcode())
+
+def test_recording_replays_when_asked_where_it_is():
+    turtle = machine.turtle()
+    machine.feed = 500
+    with turtle.recording():
+        turtle.forward(1)
+        turtle.left(90)
+        turtle.forward(1)
+        assert turtle._x == 0
+        assert turtle.pos() == [1,1,0]
+        assert turtle._heading == [0,1,0]
+        turtle.left(90)
+    assert turtle._heading == [-1,0,0]
+
+def test_recording_keeps_machine_order():
+    plotter = Plotter('onefinity.json')
+    plotter.feed = 500
+    turtle = plotter.turtle()
+    with turtle.recording():
+        turtle.forward(1)
+        plotter.queue(comment="After the first move")
+        turtle.forward(1)
+    rows = plotter.command_queue[-3:]
+    assert [row.get('x') for row in rows] == [1, None, 2]
+
+def test_circle_tolerance_sets_steps():
+    assert chords(0.5, 360, 0.01) < chords(110, 360, 0.01)
+    plotter = Plotter('onefinity.json')
+    plotter.feed = 500
+    turtle = plotter.turtle()
+    turtle.pendown()
+    before = len(plotter.command_queue)
+    turtle.circle(110, tolerance=0.01)
+    assert len(plotter.command_queue) - before == chords(110, 360, 0.01)
+    for a, b in zip(turtle.pos(), [0,0,0]):
+        assert math.isclose(a, b, abs_tol=1e-9)
+
+def test_circle_as_arcs():
+    plotter = Plotter('onefinity.json')
+    plotter.feed = 500
+    turtle = plotter.turtle()
+    turtle.pendown()
+    turtle.circle(10, extent=90, arc=True)
+    row = plotter.command_queue[-1]
+    assert row['code'] == 'G3'
+    assert (row['x'], row['y'], row['i'], row['j']) == (10, 10, 0, 10)
+    assert turtle._heading == [0,1,0]
+    turtle.circle(-10, extent=90, arc=True)
+    row = plotter.command_queue[-1]
+    assert row['code'] == 'G2'
+    assert turtle._heading == [1,0,0]
+
+def test_circle_arcs_follow_chords():
+    for radius, extent in [(10, 90), (10, -90), (-10, 90), (-10, -90), (5, -270)]:
+        ends = []
+        for arc in (False, True):
+            plotter = Plotter('onefinity.json')
+            plotter.feed = 500
+            turtle = plotter.turtle()
+            turtle.pendown()
+            turtle.circle(radius, extent=extent, steps=None if arc else 360, arc=arc)
+            ends.append((turtle.pos(), turtle.heading))
+            if arc:
+                row = plotter.command_queue[-1]
+                assert row['code'] == ('G3' if radius*extent > 0 else 'G2')
+                assert math.isclose(math.hypot(row['i'], row['j']), abs(radius))
+        (chord_pos, chord_heading), (arc_pos, arc_heading) = ends
+        for a, b in zip(arc_pos + arc_heading, chord_pos + chord_heading):
+            assert math.isclose(a, b, abs_tol=1e-9)
+    plotter = Plotter('onefinity.json')
+    plotter.feed = 500
+    turtle = plotter.turtle()
+    turtle.pendown()
+    turtle.circle(10, -90, arc=True)
+    row = plotter.command_queue[-1]
+    assert (row['code'], row['x'], row['y'], row['i'], row['j']) == ('G2', 10, -10, 0, -10)
+
+def test_circle_radius_zero_turns_left():
+    turtle = machine.turtle()
+    turtle.circle(0, extent=90)
+    assert turtle._angle == 90
+
+def rewrite(axiom, rules, n):
+    seq = axiom
+    for _ in range(n):
+        chosen = {rule: random.choice(rules[rule]) if isinstance(rules[rule], list) else rules[rule] for rule in rules}
+        seq = ''.join(chosen.get(c, c) for c in seq)
+    return ''.join(c for c in seq if c in 'FGf@+-[]')
+
+def test_lsystem_expansion_matches_rewriting():
+    rules = {'X': 'X+YF+', 'Y': '-FX-Y'}
+    assert ''.join(expand('FX', rules, 12)) == rewrite('FX', rules, 12)
+
+def test_lsystem_expansion_is_lazy():
+    chunks = expand('F', {'F': 'F+F-F-F+F'}, 50)
+    assert set(next(chunks)) <= set('F+-')
+
+def test_stochastic_lsystem_picks_once_per_generation():
+    rules = {'X': ['F[+X]F[-X]+X', 'F[-X]F[+X]-X', 'F-X'], 'F': 'FF'}
+    random.seed(5)
+    expected = rewrite('X', rules, 5)
+    random.seed(5)
+    assert ''.join(expand('X', rules, 5)) == expected
+
+def test_lsystem_instances_match_drawing_every_command():
+    rules = {'X': 'X+YF+', 'Y': '-FX-Y'}
+    instanced = Plotter('onefinity.json')
+    drawn = Plotter('onefinity.json')
+    for plotter in (instanced, drawn):
+        plotter.feed = 500
+    first = instanced.turtle(z=-1)
+    first.lsystem(axiom='FX', rules=rules, n=14, angle=90)
+    second = drawn.turtle(z=-1)
+    with second.recording():
+        second.interpret(''.join(expand('FX', rules, 14)), 10, 90, True, [])
+    assert list(instanced.command_queue) == list(drawn.command_queue)
+
+def test_write_leaves_offsets_alone():
+    plotter = Plotter('onefinity.json')
+    plotter.feed = 500
+    turtle = plotter.turtle()
+    before = len(plotter.command_queue)
+    turtle.write("3.14", start=[100, 50])
+    assert plotter.x_offset == 0 and plotter.y_offset == 0
+    rows = plotter.command_queue[before:]
+    assert not any('offset' in row.get('comment', '') for row in rows)
+    strokes, width = glyph('3', 10)
+    first = [row for row in rows if row.get('code') == 'G1' and 'x' in row][0]
+    assert (first['x'], first['y']) == (100 + strokes[0][1][0], 50 + strokes[0][1][1])
+
+def test_glyphs_are_traced_once():
+    assert glyph('8', 7) is glyph('8', 7)
+    strokes, width = glyph('1', 20)
+    assert strokes == [[(0, 20), (0, 0)]] and width == 2
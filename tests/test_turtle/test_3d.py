@@ -0,0 +1,71 @@
+import math
+from pygdk.plotter import Plotter
+from pygdk.turtle import planar, rotation
+machine = Plotter('onefinity.json')
+
+def orthonormal(turtle):
+    frame = [turtle._heading, turtle._normal, turtle._right]
+    for i, u in enumerate(frame):
+        for j, v in enumerate(frame):
+            assert math.isclose(sum(a*b for a, b in zip(u, v)), i == j, abs_tol=1e-9)
+
+def test_frame_stays_orthonormal():
+    turtle = machine.turtle()
+    for i in range(10000):
+        turtle.pitch(3)
+        turtle.yaw(11)
+        turtle.roll(7)
+    orthonormal(turtle)
+
+def test_roll_and_pitch():
+    turtle = machine.turtle()
+    turtle.pitch(90)
+    assert turtle._heading == [0,0,1]   # Looking straight up
+    assert turtle._normal  == [-1,0,0]
+    assert turtle._right   == [0,-1,0]
+    turtle.pitch(-90)
+    turtle.roll(90)
+    assert turtle._heading == [1,0,0]
+    assert turtle._normal  == [0,1,0]   # Lying on its right side
+    assert turtle._right   == [0,0,1]
+
+def test_setting_heading_keeps_frame():
+    turtle = machine.turtle()
+    turtle.heading = [0,1,0]
+    assert turtle._right == [1,0,0]
+    turtle.pitch(90)
+    assert turtle._heading == [0,0,1]
+    orthonormal(turtle)
+
+def test_rotations_are_cached():
+    rotation.cache_clear()
+    turtle = machine.turtle()
+    turtle.pitch(90)
+    for i in range(100):
+        turtle.left(60)
+    assert rotation.cache_info().misses == 2
+
+def test_frame_updates_in_place():
+    turtle = machine.turtle()
+    heading = turtle._heading
+    turtle.pitch(30)
+    turtle.left(45)
+    turtle.roll(10)
+    assert turtle._heading is heading
+
+def test_frame_snapshot_and_restore():
+    turtle = machine.turtle()
+    turtle.pitch(30)
+    snapshot = turtle._frame.snapshot()
+    heading = list(turtle._heading)
+    turtle.left(45)
+    assert turtle._heading != heading
+    turtle._frame.restore(snapshot)
+    assert turtle._heading == heading
+
+def test_orientation_is_a_copy():
+    turtle = machine.turtle()
+    orientation = turtle.orientation
+    turtle.left(90)
+    turtle.orientation = orientation
+    assert turtle._heading == [1,0,0]
@@ -0,0 +1,80 @@
+import numpy
+from PIL import Image
+from pygdk.turtle import raster, dilate
+from pygdk.plotter import Plotter
+from pygdk.mill import Mill
+
+def serpentine(pixels):
+    height, width = pixels.shape
+    for y in range(height):
+        for x in (range(width) if y % 2 == 0 else reversed(range(width))):
+            yield x, y, pixels[y, x]
+
+def test_raster_keeps_every_pixel_on_the_path():
+    pixels = numpy.random.default_rng(1).integers(0, 4, size=(12, 15))*60
+    pixels[:, 3] = 0
+    runs = raster(pixels/255*-10)
+    cut = [[]]
+    for x, y, pixel in serpentine(pixels):
+        if pixel:
+            cut[-1].append((x, y, pixel/255*-10))
+        elif cut[-1]:
+            cut.append([])
+    cut = [points for points in cut if points]
+    assert len(runs) == len(cut)
+    for (xs, ys, zs), points in zip(runs, cut):
+        kept = list(zip(xs.tolist(), ys.tolist(), zs.tolist()))
+        assert kept[0] == points[0] and kept[-1] == points[-1]
+        for (x0, y0, z0), (x1, y1, z1) in zip(kept, kept[1:]):
+            between = points[points.index((x0, y0, z0)):points.index((x1, y1, z1))+1]
+            for n, (x, y, z) in enumerate(between):
+                assert numpy.isclose(z, z0 + (z1-z0)*n/(len(between)-1))
+
+def test_raster_merges_flat_rows():
+    runs = raster(numpy.full((3, 100), -1.0))
+    assert len(runs) == 1
+    assert len(runs[0][0]) == 6
+
+def test_heightmap_rapids_over_zero_depth(tmp_path):
+    pixels = numpy.full((1, 9), 255, dtype=numpy.uint8)
+    pixels[0, 3:6] = 0
+    Image.fromarray(pixels).save(tmp_path/'gap.png')
+    plotter = Plotter('onefinity.json')
+    plotter.feed = 500
+    turtle = plotter.turtle()
+    turtle.heightmap(tmp_path/'gap.png', z_bottom=-2)
+    cuts = [(row['code'], row.get('x'), row.get('z')) for row in plotter.command_queue if row.get('code') in ('G0', 'G1')]
+    up = plotter.safe_z
+    assert cuts == [('G0', None, up), ('G0', 0, up), ('G1', 0, -2), ('G1', 2, -2),
+                    ('G0', None, up), ('G0', 6, up), ('G1', 6, -2), ('G1', 8, -2), ('G0', None, up)]
+
+def test_dilate_keeps_the_tool_out_of_a_narrow_slot():
+    depths = numpy.zeros((1, 9))
+    depths[0, 4] = -5
+    assert dilate(depths, [(0, dx, 0) for dx in (-1, 0, 1)]).tolist() == [[0]*9]
+    ball = dilate(depths, [(0, dx, abs(dx)) for dx in (-1, 0, 1)])
+    assert ball.tolist() == [[0, 0, 0, 0, -1, 0, 0, 0, 0]]
+
+def test_tool_footprint():
+    mill = Mill('onefinity.json')
+    mill.tool = 1
+    footprint = mill.tool.footprint(1)
+    assert len(footprint) == 37
+    assert {lift for dy, dx, lift in footprint} == {0}
+
+def test_compensated_heightmap_roughs_then_finishes(tmp_path):
+    pixels = numpy.zeros((40, 40), dtype=numpy.uint8)
+    pixels[10:30, 10:30] = 255
+    Image.fromarray(pixels).save(tmp_path/'pocket.png')
+    mill = Mill('onefinity.json')
+    mill.tool = 1
+    mill.feed = 500
+    turtle = mill.turtle(verbose=True)
+    turtle.heightmap(tmp_path/'pocket.png', z_bottom=-6)
+    comments = [row.get('comment') for row in mill.command_queue if row.get('comment', '').startswith('Heightmap')]
+    assert [comment.split(',')[0] for comment in comments[1:]] == ['Heightmap | Roughing to -3.1750 mm', 'Heightmap | Roughing to -5.7500 mm', 'Heightmap | Finishing']
+    cuts = [row for row in mill.command_queue if row.get('code') == 'G1']
+    radius = mill.tool.radius
+    assert min(row['z'] for row in cuts) == -6
+    for row in cuts:
+        assert 10 + radius - 1 <= row['x'] <= 30 - radius and 10 + radius - 1 <= row['y'] <= 30 - radius
@@ -1,3 +1,4 @@
+import math
 from pygdk.turtle import Squirtle, Turtle
 from pygdk.fdm_printer import FDMPrinter
 kossel = FDMPrinter('kossel.json')
@@ -35,3 +36,22 @@ def test_squirtle_penupdown():
     assert squirtle.extrude == False
     squirtle.forward(10)
     assert squirtle.e == e-squirtle._machine.retract_f
+
+def test_squirtle_write_extrudes():
+    printer = FDMPrinter('kossel.json')
+    squirtle = printer.squirtle()
+    squirtle.write('10', height=5)
+    printer.generate_gcode('production')
+    strokes = [line for line in printer.gcode.split("\n") if line.startswith('G1') and (' X' in line or ' Y' in line)]
+    assert len(strokes) == 5
+    assert all(' E' in line for line in strokes)
+
+def test_squirtle_arc_extrudes_by_arc_length():
+    for extent in (90, -90, 270, 360):
+        squirtle = FDMPrinter('kossel.json').squirtle()
+        squirtle.extrude = True
+        squirtle.circle(10, extent, arc=True)
+        arc = squirtle.e
+        squirtle.e = 0
+        squirtle.push(math.radians(abs(extent))*10)
+        assert math.isclose(arc, squirtle.e)